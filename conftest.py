@@ -0,0 +1,3 @@
+# The *_test.py modules are stand-ins of the remote services used in test
+# mode (see main.py), not tests. Tests are in tests/
+collect_ignore_glob = ["*_test.py"]
@@ -1,7 +1,21 @@
+import statistics
+
 from models.pair import Pair
+from models.correlation_matrix import CorrelationMatrix
 from lib import util, core
+from lib.errors import *
 import gcnv
 
+HEADER_SYMBOLS = ["SPY", "TLT", "IEF", "GLD", "USO", "UNG", "FXE", "FXY",
+                    "FXB", "IYR", "XLU", "EFA", "EEM", "VXX"]
+
+# Metric keyword in the command -> CorrelationMatrix method
+METRICS = {
+    "corr": "correlation",
+    "beta": "beta",
+    "ratio": "stdev_ratio"
+}
+
 def pair(command):
     pair = Pair(command[1].upper(), command[2].upper())
     back_days = core.safe_execute(gcnv.BACK_DAYS, ValueError,
@@ -11,23 +25,39 @@ def pair(command):
     print(f"  Beta:        {format(pair.beta(back_days), '.2f')}")
     print(f"  Volat ratio: {format(pair.stdev_ratio(back_days), '.2f')}")
 
+# corrs <list> [months] [header list] [corr|beta|ratio]
 def table(command):
     back_days = core.safe_execute(gcnv.BACK_DAYS, ValueError,
                     lambda x: int(x) * 30, command[2])
-    header = ["", "SPY", "TLT", "IEF", "GLD", "USO", "UNG", "FXE", "FXY",
-                "FXB", "IYR", "XLU", "EFA", "EEM", "VXX"]
+    # The metric goes after the header list, or in its place to use the default one
+    if command[3] in METRICS:
+        metric = command[3]
+        header_list = ""
+    else:
+        metric = command[4] or "corr"
+        header_list = command[3]
+    if metric not in METRICS:
+        raise InputError(f"Unknown metric '{metric}', use one of: {', '.join(METRICS)}")
+    if header_list == "":
+        header_symbols = HEADER_SYMBOLS
+    else:
+        header_symbols = util.read_symbol_list(
+                            f"{gcnv.APP_PATH}/input/{header_list}.txt")
+    header = [""] + header_symbols
+    symbols = util.read_symbol_list(f"{gcnv.APP_PATH}/input/{command[1]}.txt")
+
+    matrix = CorrelationMatrix(symbols + header_symbols, back_days)
+    calculate = getattr(matrix, METRICS[metric])
     rows = []
-    for symbol in util.read_symbol_list(
-            f"{gcnv.APP_PATH}/input/{command[1]}.txt"):
+    for symbol in symbols:
         row = [symbol]
-        for head_symbol in header[1:]:
+        for head_symbol in header_symbols:
             if symbol == head_symbol:
                 row.append("-")
             else:
                 try:
-                    pair = Pair(head_symbol, symbol)
-                    row.append(pair.correlation(back_days))
-                except GettingInfoError:
+                    row.append(calculate(head_symbol, symbol))
+                except (GettingInfoError, ZeroDivisionError, statistics.StatisticsError):
                     row.append("-")
         rows.append(row)
-    return header, rows
\ No newline at end of file
+    return header, rows
@@ -1,46 +1,48 @@
 import os
 import gcnv
 import json
-import urllib.request
 
 from models.pair import Pair
+from models.iv import IV
+from models import storage
+from models.datahandler import DOCUMENTS
+from models.earnings import get_calendar
 from controllers.helper import *
+from ib.fetcher import SnapshotFetcher
 
 from lib import util, core
+from lib.earnings_scraper import EarningsScraper
 
 def update_stock(command):
     text_file = f"{gcnv.APP_PATH}/input/{command[1]}.txt"
     if os.path.isfile(text_file):
         tickers = util.read_symbol_list(text_file)
-        for ticker in tickers:
-            gcnv.ib.request_market_data("stock", ticker)
     else:
-        ticker = command[1].upper()
-        gcnv.ib.request_market_data("stock", ticker)
+        tickers = [command[1].upper()]
+    missing = SnapshotFetcher(gcnv.ib).fetch("stock", tickers)
+    print(f"Updated {len(tickers) - len(missing)} of {len(tickers)} tickers")
+    if len(missing) > 0:
+        gcnv.messages.append(f"Never ticked: {', '.join(missing)}")
 
+# Earnings already stored are kept, and each one brought is stored as soon
+# as it arrives, so a failure doesn't lose the others
 def save_earnings(command):
-    earnings_data = {}
-    for ticker in util.read_symbol_list(f"{gcnv.APP_PATH}/input/{command[1]}.txt"):
-        f = urllib.request.urlopen(f"https://api.nasdaq.com/api/analyst/{ticker}/earnings-date")
-        page_bytes = f.read()
-        # ++ Scraping ++
-        #location = page_bytes.find(b"earnings on")
-        # ++++++++++++++
-        # ++ JSON ++
-        response = json.loads(page_bytes)
-        if not response['data']:
-            print(f"No data for {ticker}")
+    path = f"{gcnv.APP_PATH}/data/earnings.json"
+    try:
+        with open(path, "r") as f:
+            earnings_data = json.load(f)
+    except (ValueError, FileNotFoundError):
+        earnings_data = {}
+    tickers = util.read_symbol_list(f"{gcnv.APP_PATH}/input/{command[1]}.txt")
+    for ticker, earnings, message in EarningsScraper().scrape(tickers):
+        print(message)
+        if earnings is None:
             continue
-        data = response['data']['reportText']
-        location = data.find('earnings on')
-        # ++++++++++
-        if location == -1:
-            print(f"Couldn't find earnings for {ticker}")
-        else:
-            earnings_data[ticker] = data[location+13:location+25]
-            print(f"Stored earnings for {ticker}")
-    with open(f"{gcnv.APP_PATH}/data/earnings.json", "w") as f:
-        json.dump(earnings_data, f, indent=4)
+        earnings_data[ticker] = earnings
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(earnings_data, f, indent=4)
+        os.replace(f"{path}.tmp", path)
+    get_calendar().invalidate()
 
 def delete(command):
     if command[1] == "":
@@ -54,10 +56,33 @@ def delete(command):
             gcnv.data_handler.delete_ticker(ticker.upper())
             print(f"{ticker} deleted")
 
+# Copies the data tree to another format, eg. 'convert bin' or 'convert json'
+def convert(command):
+    target_format = command[1]
+    if target_format not in storage.STORAGES:
+        print(f"Unknown format '{target_format}', use one of: {', '.join(storage.STORAGES)}")
+        return
+    if target_format == gcnv.DATA_FORMAT:
+        print(f"Data is already stored as {target_format}")
+        return
+    gcnv.data_handler.compact() # pending changes are also converted
+    converted = storage.convert(DOCUMENTS, gcnv.DATA_FORMAT, target_format)
+    print(f"Converted {converted} series to {target_format}. "
+          f"Set DATA_FORMAT = \"{target_format}\" in gcnv.py to use them.")
+
 def chart_pair(command):
     print("Remember to bring data before with the 'pair' command (if needed).")
     ps = process_pair_string(command[2])
     pair = Pair(ps.ticker1, ps.ticker2, ps.stdev_ratio)
     back_days = core.safe_execute(gcnv.PAIR_BACK_DAYS, ValueError,
                     lambda x: int(x) * 30, command[3])
-    pair.output_chart(back_days)
\ No newline at end of file
+    pair.output_chart(back_days)
+
+# chart ivr <ticker> <months> <years of history, all by default>
+def chart_iv_rank(command):
+    print("Remember to bring data before with the 'prvol' command (if needed).")
+    back_days = core.safe_execute(gcnv.BACK_DAYS, ValueError,
+                    lambda x: int(x) * 30, command[3])
+    history_days = core.safe_execute(None, ValueError,
+                    lambda x: int(x) * 365, command[4])
+    IV(command[2].upper()).output_rank_chart(back_days, history_days)
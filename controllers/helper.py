@@ -1,6 +1,8 @@
 import os
-from datetime import date, timedelta
+import multiprocessing
 from lib import util, core
+from ib.fetcher import HistoricalFetcher
+from ib import fetch_planner
 import gcnv
 
 def chart_link(ticker):
@@ -15,26 +17,77 @@ def process_pair_string(pair_string):
                                             float, data.stdev_ratio)
     return data
 
+DOCUMENT_NAMES = {"iv": "IV", "hv": "HV", "stock": "stock"}
+
 def bring_if_connected(ticker):
     if gcnv.ib is None:
         return
+    req_ids = []
+    for document in stale_documents(ticker):
+        if gcnv.ib.already_requested(document, ticker):
+            continue
+        print(f"Getting {DOCUMENT_NAMES[document]} data for ticker {ticker}...")
+        req_ids += gcnv.ib.request_historical_data(document, ticker)
+    gcnv.ib.wait_for_async_request(req_ids)
+
+# Brings the data of all the tickers at once, with several requests in flight
+def bring_all_if_connected(tickers):
+    if gcnv.ib is None:
+        return
+    series = [(document, ticker) for ticker in dict.fromkeys(tickers)
+                for document in stale_documents(ticker)
+                if not gcnv.ib.already_requested(document, ticker)]
+    if len(series) == 0:
+        return
+    print(f"Getting {len(series)} series of data for {len(tickers)} tickers...")
+    HistoricalFetcher(gcnv.ib).fetch(series)
+
+# Documents of ticker missing trading days
+def stale_documents(ticker):
+    documents = ["stock"]
     if gcnv.BRING_VOLATILITY_DATA and ticker in gcnv.v_tickers:
-        max_stored_date = gcnv.data_handler.get_max_stored_date("iv", ticker)
-        if (max_stored_date is None) or max_stored_date.date() < date.today():
-            print(f"Getting IV data for ticker {ticker}...")
-            gcnv.ib.request_historical_data("iv", ticker)
-
-        max_stored_date = gcnv.data_handler.get_max_stored_date("hv", ticker)
-        # Using arbitrary 4 days because is not needed day to day
-        if (max_stored_date is None) or (max_stored_date.date() < (date.today() - timedelta(days = 4))):
-            print(f"Getting HV data for ticker {ticker}...")
-            gcnv.ib.request_historical_data("hv", ticker)
-
-    max_stored_date = gcnv.data_handler.get_max_stored_date("stock", ticker)
-    if (max_stored_date is None) or max_stored_date.date() < date.today(): # need to modify if today the market is not open (weekend)
-        print(f"Getting stock data for ticker {ticker}...")
-        gcnv.ib.request_historical_data("stock", ticker)
-    gcnv.ib.wait_for_async_request()
+        documents = ["iv", "hv"] + documents
+    return [document for document in documents
+                if len(fetch_planner.plan(document, ticker)) > 0]
+
+# [(back_days, column suffix)] of a comma separated list of months
+# (eg. "3,6,12" -> suffixes "_3", "_6", "_12"). A single horizon keeps the
+# column names as they are
+def get_horizons(argument, default_back_days):
+    try:
+        months = list(dict.fromkeys(int(month) for month in argument.split(',')))
+    except ValueError:
+        return [(default_back_days, "")]
+    if len(months) == 1:
+        return [(months[0] * 30, "")]
+    return [(month * 30, f"_{month}") for month in months]
+
+# Joins the rows calculated for each horizon: columns not in fixed_columns
+# are repeated once per horizon, next to each other. Their names get the
+# suffix of the horizon, also the untitled ('-') history columns
+def group_horizons(rows, fixed_columns):
+    grouped = []
+    for i in range(len(rows[0])):
+        if i in fixed_columns:
+            grouped.append(rows[0][i])
+        else:
+            grouped += [row[i] for row in rows]
+    return grouped
+
+def group_horizons_header(header, fixed_columns, horizons):
+    return group_horizons([[name if i in fixed_columns else name + suffix
+                                for i, name in enumerate(header)]
+                            for _, suffix in horizons], fixed_columns)
+
+# Rows of every horizon, calculated from the widest one so the list_data
+# windows of the others are suffixes of its alignment. [] if any fails
+def horizons_row(function, item, horizons, fixed_columns):
+    rows = {}
+    for back_days, _ in sorted(horizons, reverse = True):
+        rows[back_days] = function(item, back_days)
+        if len(rows[back_days]) == 0:
+            return []
+    return group_horizons([rows[back_days] for back_days, _ in horizons], fixed_columns)
 
 def up_down_closes_str(stock, back_days):
     map = ["+" if udc == 1 else "-" for udc in stock.up_down_closes(back_days)]
@@ -50,4 +103,31 @@ def get_tickers_from_command(name):
         tickers = list(set(tickers))
     else:
         tickers = [name.upper()]
-    return tickers
\ No newline at end of file
+    return tickers
+
+# Returns [function(item, *args) for item in items] computed by gcnv.WORKERS
+# processes, in the same order. Workers are forked, so they read the data
+# already loaded without copying it, and don't use the remote connection:
+# data must be brought before calling this
+def map_rows(function, items, *args):
+    if gcnv.WORKERS <= 1 or len(items) < 2:
+        return [function(item, *args) for item in items]
+    gcnv.data_handler.stop_warm_up() # its locks would be copied held
+    context = multiprocessing.get_context("fork")
+    chunksize = max(1, len(items) // (gcnv.WORKERS * 4))
+    with context.Pool(gcnv.WORKERS, initializer = init_worker) as pool:
+        results = pool.starmap(run_in_worker,
+                    [(function, item, args) for item in items], chunksize)
+    rows = []
+    for row, messages in results:
+        gcnv.messages += messages
+        rows.append(row)
+    return rows
+
+def init_worker():
+    gcnv.ib = None
+
+def run_in_worker(function, item, args):
+    gcnv.messages = []
+    row = function(item, *args)
+    return row, gcnv.messages
@@ -1,9 +1,5 @@
 import statistics
-import json
-from json.decoder import JSONDecodeError
-from datetime import datetime, date, timedelta
 import time
-from collections import defaultdict
 
 from lib import util, core
 from lib.errors import *
@@ -14,11 +10,18 @@ from models.mixed_vs import MixedVs
 from models.stock import Stock
 from models.pair import Pair
 from models import notional
+from models.earnings import get_calendar
+from models.series import int_to_date
 import gcnv
 
+# Columns that don't depend on the horizon (back days)
+FIXED_COLUMNS = ['Tckr', 'Date', 'Last', 'L%chg', 'UD14', 'Erngs', 'D2Ern', 'Chart']
+
 def table(command):
-    header = get_header()
+    horizons = get_horizons(command[2], gcnv.BACK_DAYS)
+    header = get_header(horizons)
     rows = get_rows(command)
+    rank_column_name = "BDRnk" + horizons[0][1]
 
     # Remove year from date
     current_year = time.strftime('%Y')
@@ -27,7 +30,7 @@ def table(command):
 
     # Filter
     if 'filter' in command:
-        rank_column = header.index("BDRnk")
+        rank_column = header.index(rank_column_name)
         options_list = (util.read_symbol_list(f"{gcnv.APP_PATH}/input/options.txt") +
                         util.read_symbol_list(f"{gcnv.APP_PATH}/input/stocks.txt"))
         rows = [row for row in rows if not (
@@ -37,7 +40,7 @@ def table(command):
                     #the beginning of the if condition
 
     # Sorting
-    order_column = command[3] if command[3] in header else "BDRnk"
+    order_column = command[3] if command[3] in header else rank_column_name
     order_column = header.index(order_column)
     rows.sort(key = lambda row: row[order_column], reverse = True)
     util.add_separators_to_list(rows, lambda row, sep: row[order_column] <= sep, [50])
@@ -47,14 +50,12 @@ def table(command):
 
 def get_rows(command):
     tickers = get_tickers_from_command(command[1])
-    rows = []
-    for ticker in tickers:
-        row = get_row(ticker, command)
-        if len(row) > 0:
-            rows.append(row)
-    return rows
+    bring_all_if_connected(tickers + ["SPY"])
+    if gcnv.WORKERS > 1:
+        gcnv.data_handler.load_tickers(tickers + ["SPY"])
+    return [row for row in map_rows(get_row, tickers, command) if len(row) > 0]
 
-def get_header():
+def get_header(horizons = None):
     header = ['Tckr', 'Date']
     header += [
         'Last',
@@ -84,17 +85,21 @@ def get_header():
         'IVR'
     ]
     header += ['-'] * (gcnv.IVR_RESULTS - 1) # 1 is the IVR title
+    if horizons is not None and len(horizons) > 1:
+        header = group_horizons_header(header, fixed_columns(header), horizons)
     return header
 
 def get_row(ticker, command):
+    return horizons_row(get_horizon_row, ticker,
+                get_horizons(command[2], gcnv.BACK_DAYS), fixed_columns(get_header()))
+
+def get_horizon_row(ticker, back_days):
     try:
         bring_if_connected(ticker)
         date = gcnv.data_handler.get_max_stored_date("stock", ticker)
         if date is None:
             return []
         date = util.date_in_string(date)
-        back_days = core.safe_execute(gcnv.BACK_DAYS, ValueError, 
-            lambda x: int(x) * 30, command[2])
 
         iv = IV(ticker)
         hv = HV(ticker)
@@ -102,7 +107,7 @@ def get_row(ticker, command):
         stock = Stock(ticker)
         spy_pair = Pair(ticker, "SPY")
         spy_iv = IV("SPY")
-        earnings_data = load_earnings()
+        earnings = get_calendar().get(ticker)
         row = [ticker, date]
         # Price related data
         row += [
@@ -123,8 +128,8 @@ def get_row(ticker, command):
                 spy_pair.stdev_ratio(back_days)), 1),
             round(notional.directional_options_number(stock.get_close_at(date),
                 spy_pair.stdev_ratio(back_days)), 1),
-            earnings_data[ticker][0],
-            earnings_data[ticker][1],
+            earnings[0],
+            earnings[1],
             chart_link(ticker)
         ]
         # Volatility related data
@@ -145,28 +150,23 @@ def get_row(ticker, command):
         print(e)
         return []
 
-def load_earnings():
-    data = None
-    try:
-        with open(f"{gcnv.APP_PATH}/data/earnings.json", "r") as f:
-            data = json.load(f)
-    except (JSONDecodeError, FileNotFoundError) as e:
-        data = {}
-    data = defaultdict(lambda: ["-", "-"], data)
-    today = date.today()
-    yesterday = today - timedelta(days=1)
-    for ticker in data.keys():
-        try:
-            earnings_date = datetime.strptime(data[ticker][:10], "%m/%d/%Y").date()
-            if earnings_date == today:
-                data[ticker] = "T" + data[ticker][10:]
-            elif earnings_date == yesterday:
-                data[ticker] = "Y" + data[ticker][10:]
-            elif earnings_date < yesterday:
-                data[ticker] = "P"
-            else:
-                data[ticker] = data[ticker].replace(f"/{today.year}", "")
-            data[ticker] = [data[ticker], (earnings_date - today).days]
-        except ValueError:
-            data[ticker] = ["PrsErr", "-"]
-    return data
\ No newline at end of file
+def fixed_columns(header):
+    return {header.index(name) for name in FIXED_COLUMNS}
+
+# ivr <ticker> <months> <years of history, all by default>
+# IV ranks of each date against its own window, most recent first, rounded
+# like the other rank columns
+def rank_history(command):
+    ticker = command[1].upper()
+    back_days = core.safe_execute(gcnv.BACK_DAYS, ValueError,
+                    lambda x: int(x) * 30, command[2])
+    history_days = core.safe_execute(None, ValueError,
+                    lambda x: int(x) * 365, command[3])
+    bring_if_connected(ticker)
+    header = ['Date', 'MMRnk', '%Rnk']
+    rows = [[str(int_to_date(date).date()), '-' if mm_rank is None else round(mm_rank),
+                round(percentile_rank)]
+                for date, mm_rank, percentile_rank
+                in IV(ticker).rank_history(back_days, history_days)]
+    rows.reverse()
+    return header, rows
@@ -1,30 +1,39 @@
 from controllers.helper import *
-import time
+from ib import request_registry
+from lib.errors import *
 import gcnv
 
+# Strikes tried around the wanted one, the first quoted is used
+STRIKE_LADDER = (0, 1, -1, 2, -2, 3, -3)
+
 def get_header():
     return ['Tckr', 'Ratio', 'DeltaH', 'DeltaL', 
             'StrikeH', 'StrikeL', 'PriceH', 'PriceL']
 
 def get_rows(command):
     tickers = get_tickers_from_command(command[1])
+    expiration_date = command[2] # something like: "20191220"
+    wanted = {}
     for ticker in tickers:
         if ticker not in gcnv.v_tickers:
             continue
         closes = gcnv.data_handler.list_data([["stock", ticker]], 45)[0]
         if len(closes) == 0:
             continue
-    
-        current = int(closes[-1])
-        min_ = int(min(closes))
-        gcnv.options.pop(ticker, None) # delete all elements for ticker first
-        try_strikes(ticker, current, 'P', command[2]) # command[2] is something like: "20191220"
-        try_strikes(ticker, min_, 'P', command[2])
+        wanted[ticker] = [int(closes[-1]), int(min(closes))]
 
-    print(gcnv.options)
+    # Every strike of every ticker is requested at once
+    request_quotes([(ticker, expiration_date, strike + i, 'P')
+                        for ticker, strikes in wanted.items()
+                        for strike in strikes
+                        for i in STRIKE_LADDER])
 
     rows = []
-    for ticker, values in gcnv.options.items():
+    for ticker, strikes in wanted.items():
+        values = [quote for quote in (first_quote(ticker, expiration_date, strike, 'P')
+                                        for strike in strikes) if quote is not None]
+        if len(values) == 0:
+            continue
         values = [v for v in values if v['price'] and v['price'] != 0]
         if len(values) == 2:
             values.sort(key=lambda v: v['price'])
@@ -43,14 +52,35 @@ def get_rows(command):
         rows.append(row)
     return rows
 
-def try_strikes(ticker, strike, right, expiration_date):
-    gcnv.ib.wait_for_async_request() # to be sure there are no pending requests
-    for i in (0, 1, -1, 2, -2, 3, -3):
-        sub_strike = strike + i
-        gcnv.ib.request_options_contract(
-                ticker, sub_strike, right, expiration_date)
-        gcnv.ib.wait_for_async_request()
-        if (ticker in gcnv.options and
-                    next(filter(lambda d: d['strike'] == sub_strike,
-                            gcnv.options[ticker]), None)):
-            break
\ No newline at end of file
+# Requests the contracts without a fresh snapshot, in batches of
+# gcnv.OPTIONS_BATCH_SIZE. Contracts answered without a quote are stored too
+def request_quotes(contracts):
+    contracts = [contract for contract in dict.fromkeys(contracts)
+                    if gcnv.data_handler.get_option_quote(*contract) is None]
+    done = set() # answered req ids, the registry forgets them when they end
+    listener = lambda req_id, info: (info.state == request_registry.DONE
+                                        and done.add(req_id))
+    gcnv.ib.requests.add_listener(listener)
+    try:
+        for i in range(0, len(contracts), gcnv.OPTIONS_BATCH_SIZE):
+            req_ids = {gcnv.ib.request_options_contract(ticker, strike, right, expiration_date):
+                            (ticker, expiration_date, strike, right)
+                        for ticker, expiration_date, strike, right
+                            in contracts[i:i + gcnv.OPTIONS_BATCH_SIZE]}
+            try:
+                gcnv.ib.wait_for_async_request(list(req_ids))
+            except GettingInfoError as e:
+                gcnv.messages.append(f"Options: {e}")
+            for req_id, contract in req_ids.items():
+                if (gcnv.data_handler.get_option_quote(*contract) is None and
+                        req_id in done):
+                    gcnv.data_handler.store_option_quote(*contract, None, None)
+    finally:
+        gcnv.ib.requests.remove_listener(listener)
+
+def first_quote(ticker, expiration_date, strike, right):
+    for i in STRIKE_LADDER:
+        quote = gcnv.data_handler.get_option_quote(ticker, expiration_date, strike + i, right)
+        if quote is not None and quote['price'] is not None:
+            return quote
+    return None
@@ -6,12 +6,17 @@ from models.pair import Pair
 from controllers.helper import *
 import gcnv
 
+# Columns that don't depend on the horizon (back days). '-' are the
+# separators, the past closes after them also are untitled
+FIXED_COLUMNS = ['Pair', 'Date', '-']
+
 def table(command):
-    header = get_header()
+    horizons = get_horizons(command[2], gcnv.PAIR_BACK_DAYS)
+    header = get_header(horizons)
     rows = get_rows(command)
 
     # Sorting
-    order_column = command[2] if command[2] in header else "Rank"
+    order_column = command[2] if command[2] in header else "Rank" + horizons[0][1]
     order_column = header.index(order_column)
     rows.sort(key = lambda row: row[order_column], reverse = True)
     util.add_separators_to_list(rows, lambda row, sep: row[order_column] <= sep, [50])
@@ -20,14 +25,16 @@ def table(command):
 
 def get_rows(command):
     pairs = get_tickers_from_command(command[1])
-    rows = []
+    tickers = []
     for pair in pairs:
-        row = get_row(pair, command)
-        if len(row) > 0:
-            rows.append(row)
-    return rows
+        ps = process_pair_string(pair)
+        tickers += [ps.ticker1, ps.ticker2]
+    bring_all_if_connected(tickers)
+    if gcnv.WORKERS > 1:
+        gcnv.data_handler.load_tickers(tickers)
+    return [row for row in map_rows(get_row, pairs, command) if len(row) > 0]
 
-def get_header():
+def get_header(horizons = None):
     header = ['Pair',
         'Date',
         '-',
@@ -42,15 +49,19 @@ def get_header():
         '210R',
         '-']
     header += ['-'] * gcnv.PAIR_PAST_RESULTS
+    if horizons is not None and len(horizons) > 1:
+        header = group_horizons_header(header, fixed_columns(header), horizons)
     return header
 
 def get_row(pair, command):
+    return horizons_row(get_horizon_row, pair,
+                get_horizons(command[2], gcnv.PAIR_BACK_DAYS), fixed_columns(get_header()))
+
+def get_horizon_row(pair, back_days):
     ps = process_pair_string(pair)
     ticker1 = ps.ticker1
     ticker2 = ps.ticker2
     fixed_stdev_ratio = ps.stdev_ratio
-    back_days = core.safe_execute(gcnv.PAIR_BACK_DAYS, ValueError, 
-        lambda x: int(x) * 30, command[2])
     bring_if_connected(ticker1)
     bring_if_connected(ticker2)
     try:
@@ -78,3 +89,7 @@ def get_row(pair, command):
     except (GettingInfoError, ZeroDivisionError, statistics.StatisticsError) as e:
         print(e)
         return []
+
+def fixed_columns(header):
+    past_closes = len(header) - gcnv.PAIR_PAST_RESULTS
+    return {i for i, name in enumerate(header[:past_closes]) if name in FIXED_COLUMNS}
@@ -7,6 +7,40 @@ PAIR_PAST_RESULTS = 5
 BACK_DAYS = 365
 PAIR_BACK_DAYS = 90
 BRING_VOLATILITY_DATA = False
+OUTPUT_FORMAT = "html" # reports format: "html", "csv", "jsonl" or "bin", or 'out:<format>' in a command
+
+# Data loading
+LAZY_LOAD = True # parse ticker files the first time they are used
+WARM_UP_LIST = None # input list name loaded in background at startup, eg. "main_stock_list"
+DATA_FORMAT = "json" # "json" or "bin" (memory mapped), switch with the 'convert' command
+JOURNAL_COMPACT_SIZE = 5 * 1024 * 1024 # bytes of data/journal.log before rewriting data files
+
+# Calculations
+ENGINE = "python" # "python" or "numpy" (needs numpy installed)
+ANALYTICS_CACHE_SIZE = 50000 # max cached results of model calculations
+WORKERS = 1 # processes calculating prvol and pair rows, 1 to calculate them serially
+
+# Remote
+REQUEST_TIMEOUT = 20 # seconds to wait for each request
+API_READY_TIMEOUT = 120 # seconds to wait for the connection
+GAP_FILL_BACK_DAYS = BACK_DAYS # days back searched for missing dates inside a series
+GAP_MERGE_DAYS = 7 # missing ranges closer than these days are brought in one request
+EMPTY_SETTLE_DAYS = 5 # days after which a date a request didn't bring isn't asked again
+MAX_GAP_REQUESTS = 3 # requests per series, over it everything missing is brought at once
+SNAPSHOT_WAVE_SIZE = 50 # snapshot prices requested at once by 'update'
+OPTIONS_BATCH_SIZE = 50 # options snapshots requested at once
+OPTIONS_TTL = 15 * 60 # seconds an options snapshot is used before requesting it again
+HISTORICAL_IN_FLIGHT = 10 # historical data requests waiting for an answer at once
+HISTORICAL_RATE = 1 # historical data requests per second sent on average
+HISTORICAL_BURST = 30 # historical data requests sent at once before pacing them
+PACING_RETRIES = 3 # times a request rejected for pacing violation is sent again
+PACING_BACKOFF = 10 # seconds before sending it again, doubled on each retry
+
+# Earnings
+EARNINGS_URL = "https://api.nasdaq.com" # a local stand-in is used in test mode
+EARNINGS_WORKERS = 8 # concurrent requests
+EARNINGS_TIMEOUT = 10 # seconds to wait for each request
+EARNINGS_RETRIES = 2 # times a failed request is sent again
 
 # Notional
 DIRECTIONAL_DOLLARS = 3000 # for a 10 volatility ratio
@@ -25,9 +59,5 @@ messages = None
 v_tickers = None
 store_dir = None
 ib = None
-
-
-# temp variable to hold options data
-# until datahandler is restructured
-from collections import defaultdict
-options = defaultdict(list)
\ No newline at end of file
+analytics_cache = None
+earnings_calendar = None
@@ -0,0 +1,86 @@
+import math
+from datetime import date, timedelta
+
+from lib import core, util, trading_calendar
+from models.series import date_to_int
+import gcnv
+
+# Plans the historical data requests of a series from the trading days it
+# misses: the days after the last stored one and the holes in the last
+# gcnv.GAP_FILL_BACK_DAYS, each range brought with its own request. Days
+# already requested that came back empty (eg. IV on days without quotes)
+# aren't planned again
+
+HORIZONS = {"2 Y": 730, "3 M": 91} # duration string -> days, when nothing is stored
+STALE_DAYS = {"iv": 0, "hv": 4, "stock": 0} # Using arbitrary 4 days for hv because is not needed day to day
+
+# Returns [Struct(document, ticker, duration_string, end_date_time, missing)],
+# missing is the (first, last) dates the request should bring, None when
+# nothing is stored
+def plan(document, ticker, today = None):
+    today = date.today() if today is None else today
+    horizon = "3 M" if util.contract_type(ticker) == "FUT" else "2 Y"
+    first = gcnv.data_handler.get_min_stored_date(document, ticker)
+    last = gcnv.data_handler.get_max_stored_date(document, ticker)
+    if last is None:
+        return [request(document, ticker, horizon, '')]
+
+    start = max(first.date(), today - timedelta(days = gcnv.GAP_FILL_BACK_DAYS),
+                today - timedelta(days = HORIZONS[horizon]))
+    dates, _ = gcnv.data_handler.get_window(document, ticker, today, (today - start).days + 1)
+    ranges = missing_ranges(dates, start, today,
+                gcnv.data_handler.get_empty_dates(document, ticker))
+    if (len(ranges) > 0 and ranges[-1][0] > last.date()
+            and (today - last.date()).days <= STALE_DAYS[document]):
+        ranges.pop() # recent enough
+    last_trading_day = trading_calendar.latest_trading_day(today)
+    requests = []
+    for start, end in merge_ranges(ranges):
+        if end >= last_trading_day:
+            requests.append(request(document, ticker, duration_string(start, today), '',
+                                    (start, end)))
+        else:
+            requests.append(request(document, ticker, duration_string(start, end),
+                                    f"{end.strftime('%Y%m%d')} 23:59:59 US/Eastern",
+                                    (start, end)))
+    return requests
+
+# Ranges (first, last) of consecutive trading days between start and end
+# not in dates nor in skipped, oldest first
+def missing_ranges(dates, start, end, skipped = ()):
+    stored = set(dates) | set(skipped)
+    ranges = []
+    previous_missing = False
+    for day in trading_calendar.trading_days(start, end):
+        if date_to_int(day) in stored:
+            previous_missing = False
+        elif previous_missing:
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+            previous_missing = True
+    return [tuple(missing_range) for missing_range in ranges]
+
+# Ranges closer than gcnv.GAP_MERGE_DAYS are brought in the same request,
+# and all of them at once if they need more than gcnv.MAX_GAP_REQUESTS
+def merge_ranges(ranges):
+    merged = []
+    for start, end in ranges:
+        if len(merged) > 0 and (start - merged[-1][1]).days <= gcnv.GAP_MERGE_DAYS:
+            merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    if len(merged) > gcnv.MAX_GAP_REQUESTS:
+        merged = [[merged[0][0], merged[-1][1]]]
+    return [tuple(merged_range) for merged_range in merged]
+
+# Durations over a year must be asked in years
+def duration_string(start, end):
+    days = (end - start).days + 1
+    if days > 365:
+        return f"{math.ceil(days / 365)} Y"
+    return f"{days} D"
+
+def request(document, ticker, duration_string, end_date_time, missing = None):
+    return core.Struct(document=document, ticker=ticker, duration_string=duration_string,
+                end_date_time=end_date_time, missing=missing)
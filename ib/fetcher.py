@@ -0,0 +1,174 @@
+import logging
+import time
+from collections import deque
+from queue import Queue, Empty
+
+from lib import util
+from ib import request_registry, fetch_planner
+import gcnv
+
+PACING_ERROR_CODES = (162, 420)
+NO_DATA_ERROR_CODE = 162
+
+# Allows rate requests per second, and bursts of up to capacity requests
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    # Takes a token if available
+    def take(self):
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    # Seconds until a token is available
+    def wait_time(self):
+        self.refill()
+        return max(0, (1 - self.tokens) / self.rate)
+
+    # Private
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+# Brings the historical data of many (document, ticker) series keeping up
+# to in_flight requests waiting for an answer, paced by a TokenBucket.
+# Requests rejected with a pacing violation are sent again after a backoff,
+# other errors and timeouts are reported in gcnv.messages
+class HistoricalFetcher:
+    def __init__(self, ib, in_flight = None, bucket = None, retries = None, backoff = None):
+        self.ib = ib
+        self.in_flight = gcnv.HISTORICAL_IN_FLIGHT if in_flight is None else in_flight
+        self.bucket = (TokenBucket(gcnv.HISTORICAL_RATE, gcnv.HISTORICAL_BURST)
+                        if bucket is None else bucket)
+        self.retries = gcnv.PACING_RETRIES if retries is None else retries
+        self.backoff = gcnv.PACING_BACKOFF if backoff is None else backoff
+
+    # Returns the series that couldn't be brought
+    def fetch(self, series):
+        jobs = deque()
+        for document, ticker in series:
+            if not self.ib.mark_requested(document, ticker):
+                continue
+            for request in fetch_planner.plan(document, ticker):
+                request.attempts = 0
+                jobs.append(request)
+
+        delayed = [] # (time to send again, job)
+        sent = {} # req_id -> job
+        failed = []
+        finished = Queue()
+        listener = lambda req_id, info: finished.put((req_id, info))
+        self.ib.requests.add_listener(listener)
+        try:
+            while jobs or delayed or sent:
+                now = time.monotonic()
+                for ready in [item for item in delayed if item[0] <= now]:
+                    delayed.remove(ready)
+                    jobs.appendleft(ready[1])
+
+                while jobs and len(sent) < self.in_flight and self.bucket.take():
+                    job = jobs.popleft()
+                    job.attempts += 1
+                    job.deadline = now + gcnv.REQUEST_TIMEOUT
+                    req_id = self.ib.send_historical_request(job.document, job.ticker,
+                                    job.duration_string, job.end_date_time, job.missing)
+                    sent[req_id] = job
+
+                for req_id in [req_id for req_id, job in sent.items() if job.deadline <= now]:
+                    self.ib.requests.fail(req_id, error_string = "timeout")
+
+                try:
+                    req_id, info = finished.get(timeout = self.wait_time(jobs, delayed, sent))
+                except Empty:
+                    continue
+                while True:
+                    self.finish(sent.pop(req_id, None), info, delayed, failed)
+                    try:
+                        req_id, info = finished.get_nowait()
+                    except Empty:
+                        break
+                self.ib.ingest()
+        finally:
+            self.ib.requests.remove_listener(listener)
+            self.ib.ingest()
+        return failed
+
+    # Private
+
+    def finish(self, job, info, delayed, failed):
+        if job is None: # not sent by this fetcher
+            return
+        if info.state != request_registry.FAILED:
+            return
+        if is_pacing_violation(info.error_code, info.error_string) and job.attempts <= self.retries:
+            wait = self.backoff * 2 ** (job.attempts - 1)
+            logging.info(f"Pacing violation for {job.document},{job.ticker}, retrying in {wait}s")
+            delayed.append((time.monotonic() + wait, job))
+        else:
+            self.fail(job, info.error_string, failed)
+
+    def fail(self, job, reason, failed):
+        gcnv.messages.append(f"{job.document},{job.ticker} not brought: {reason}")
+        failed.append((job.document, job.ticker))
+
+    # Seconds until something can be done if no request ends
+    def wait_time(self, jobs, delayed, sent):
+        now = time.monotonic()
+        times = [job.deadline - now for job in sent.values()]
+        times += [ready - now for ready, _ in delayed]
+        if jobs and len(sent) < self.in_flight:
+            times.append(self.bucket.wait_time())
+        return max(0.01, min(times, default = 0.01))
+
+def is_pacing_violation(error_code, error_string):
+    return error_code in PACING_ERROR_CODES and "pacing" in error_string.lower()
+
+# IB answers a range without any bar with this error instead of an empty answer
+def is_no_data(error_code, error_string):
+    return (error_code == NO_DATA_ERROR_CODE and "no data" in error_string.lower()
+            and not is_pacing_violation(error_code, error_string))
+
+# Brings the snapshot price of many tickers in waves of up to wave_size
+# concurrent requests, each one waited until its own timeout. Prices are
+# stored on today's date in one batch
+class SnapshotFetcher:
+    def __init__(self, ib, wave_size = None):
+        self.ib = ib
+        self.wave_size = gcnv.SNAPSHOT_WAVE_SIZE if wave_size is None else wave_size
+
+    # Returns the tickers that never ticked
+    def fetch(self, document, tickers):
+        tickers = list(dict.fromkeys(tickers))
+        prices = {}
+        finished = Queue()
+        listener = lambda req_id, info: finished.put((req_id, info))
+        self.ib.requests.add_listener(listener)
+        try:
+            for i in range(0, len(tickers), self.wave_size):
+                sent = {}
+                for ticker in tickers[i:i + self.wave_size]:
+                    req_id = self.ib.request_market_data(document, ticker, batch = True)
+                    sent[req_id] = time.monotonic() + gcnv.REQUEST_TIMEOUT
+                while sent:
+                    now = time.monotonic()
+                    for req_id in [req_id for req_id, deadline in sent.items() if deadline <= now]:
+                        self.ib.requests.fail(req_id, error_string = "timeout")
+                    try:
+                        req_id, info = finished.get(
+                                timeout = max(0.01, min(sent.values()) - time.monotonic()))
+                    except Empty:
+                        continue
+                    if sent.pop(req_id, None) is not None and info.price is not None:
+                        prices[info.ticker] = info.price
+        finally:
+            self.ib.requests.remove_listener(listener)
+        gcnv.data_handler.store_date(document, util.today_in_string(), prices)
+        return [ticker for ticker in tickers if ticker not in prices]
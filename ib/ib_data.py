@@ -1,99 +1,114 @@
 # Need to set PYTHONPATH environment variable with path to ibapi library
 
-from threading import Thread
+from threading import Thread, Event
+from queue import Queue, Empty
 import logging
 import time
-from datetime import datetime
 
 from ibapi.wrapper import EWrapper
 from ibapi.client import EClient
 
-from lib import util, core
+from lib import util
+from ib.request_registry import RequestRegistry
+from ib import fetch_planner, fetcher
 from lib.errors import *
 import gcnv
 
+WHAT_TO_SHOW = {
+    "iv": "OPTION_IMPLIED_VOLATILITY",
+    "hv": "HISTORICAL_VOLATILITY",
+    "stock": "ASK"
+}
+
 class IBData(EClient, EWrapper):
     def __init__(self):
         EClient.__init__(self, wrapper = self)
         
         # variables
         self.next_req_id = 0
-        self.calling_info = {}
+        self.requests = RequestRegistry()
+        self.incoming = Queue() # (data handler method, args) called from the main thread by ingest
         self.session_requested_data = set()
         self.api_ready = False
+        self.api_ready_event = Event()
 
         self.connect("127.0.0.1", 7496, 0)
 
         self.message_loop = Thread(target = self.run)
         self.message_loop.start()
 
+    # Returns the ids of the requests bringing the dates not stored yet
     def request_historical_data(self, requested_data, ticker):
-        # Remember queries in this session
+        if not self.mark_requested(requested_data, ticker):
+            return []
+        return [self.send_historical_request(requested_data, ticker,
+                        request.duration_string, request.end_date_time, request.missing)
+                for request in fetch_planner.plan(requested_data, ticker)]
+
+    # Remember queries in this session, False if already requested
+    def mark_requested(self, requested_data, ticker):
         requested_data_key = f"{requested_data},{ticker}"
         if requested_data_key in self.session_requested_data:
             gcnv.messages.append(f"{requested_data_key} already requested")
-            return
-        else:
-            self.session_requested_data.add(requested_data_key)
-
-        if requested_data == "iv":
-            what_to_show = "OPTION_IMPLIED_VOLATILITY"
-        elif requested_data == "hv":
-            what_to_show = "HISTORICAL_VOLATILITY"
-        elif requested_data == "stock":
-            what_to_show = "ASK"
-        else:
+            return False
+        self.session_requested_data.add(requested_data_key)
+        return True
+
+    def already_requested(self, requested_data, ticker):
+        return f"{requested_data},{ticker}" in self.session_requested_data
+
+    # missing: (first, last) dates the request should bring, the ones it
+    # doesn't are stored as empty
+    def send_historical_request(self, requested_data, ticker, duration_string,
+                                end_date_time = '', missing = None):
+        if requested_data not in WHAT_TO_SHOW:
             raise RuntimeError("Unknown requested_data parameter")
 
-        # Adjusting max duration_string query variable
-        duration_string = "2 Y"
-        if util.contract_type(ticker) == "FUT":
-            duration_string = "3 M"
-
-        last = gcnv.data_handler.get_max_stored_date(requested_data, ticker)
-        if last is not None:
-            delta = datetime.today() - last
-            if delta.days <= 0:
-                return
-            elif delta.days >= 365:
-                gcnv.data_handler.delete_ticker(ticker)
-            else:
-                duration_string = f"{delta.days + 1} D"
-
-        logging.info(f"Last historical query duration string: {duration_string}")
+        logging.info(f"Historical query duration string: {duration_string}, end: '{end_date_time}'")
         
         # Class level mappings
-        next_req_id = self.get_next_req_id()
-        self.calling_info[next_req_id] = core.Struct(
-                                            ticker=ticker,
-                                            requested_data=requested_data)
+        next_req_id = self.add_request(ticker=ticker, requested_data=requested_data, bars=[],
+                                        missing=missing)
 
         # Query
-        self.reqHistoricalData(next_req_id, util.get_contract(ticker), '',
-                            duration_string, "1 day", what_to_show, 1, 1, False, [])
+        self.reqHistoricalData(next_req_id, util.get_contract(ticker), end_date_time,
+                            duration_string, "1 day", WHAT_TO_SHOW[requested_data],
+                            1, 1, False, [])
+        return next_req_id
 
     def historicalData(self, reqId, bar_data):
         super().historicalData(reqId, bar_data)
 
-        gcnv.data_handler.store_history(
-                self.calling_info[reqId].requested_data,
-                self.calling_info[reqId].ticker,
-                bar_data.date,
-                bar_data.close
-            )
+        info = self.requests.stream(reqId)
+        if info is None: # timed out
+            return
+        info.bars.append((bar_data.date, bar_data.close))
 
+    # Bars are stored in one block when all of them are received
     def historicalDataEnd(self, reqId:int, start:str, end:str):
-        self.calling_info.pop(reqId, None)
+        info = self.requests.get(reqId)
+        if info is not None and len(info.bars) > 0:
+            dates, closes = zip(*info.bars)
+            self.incoming.put(("store_history_block",
+                                (info.requested_data, info.ticker, dates, closes)))
+        if info is not None and info.missing is not None:
+            self.incoming.put(("store_empty_range",
+                                (info.requested_data, info.ticker, *info.missing)))
+        self.finish_request(reqId)
         logging.info(f"Historical data fetched for reqId: {reqId}")
 
     ## Commented while developing the options part
-    def request_market_data(self, requested_data, ticker):
-        next_req_id = self.get_next_req_id()
-        self.calling_info[next_req_id] = core.Struct(
+    # When batch, the price is left in the request info (see SnapshotFetcher)
+    # instead of being stored
+    def request_market_data(self, requested_data, ticker, batch = False):
+        next_req_id = self.add_request(
                                 ticker=ticker,
                                 requested_data=requested_data,
-                                method='request_market_data')
+                                method='request_market_data',
+                                batch=batch,
+                                price=None)
         self.reqMktData(next_req_id, util.get_contract(ticker), "", True, False, [])
+        return next_req_id
 
     def tickPrice(self, reqId, tickType, price:float, attrib):
         super().tickPrice(reqId, tickType, price, attrib)
@@ -104,24 +119,26 @@ class IBData(EClient, EWrapper):
         if tickType != 4:
             return
 
-        calling_info = self.calling_info[reqId]
-        if calling_info.method == 'request_market_data':
-            gcnv.data_handler.store_history('stock',
-                                            calling_info.ticker,
-                                            util.today_in_string(),
-                                            price)
+        calling_info = self.requests.stream(reqId)
+        if calling_info is not None and calling_info.method == 'request_market_data':
+            calling_info.price = price
 
     def tickSnapshotEnd(self, reqId:int):
         super().tickSnapshotEnd(reqId)
-        self.calling_info.pop(reqId, None)
+        info = self.requests.get(reqId)
+        if (info is not None and info.method == 'request_market_data'
+                and not info.batch and info.price is not None):
+            self.incoming.put(("store_history_block",
+                    (info.requested_data, info.ticker, [util.today_in_string()], [info.price])))
+        self.finish_request(reqId)
 
     # bring specific options details
     def request_options_contract(self, ticker, strike, right, expiration_date):
-        next_req_id = self.get_next_req_id()
-        self.calling_info[next_req_id] = core.Struct(
+        next_req_id = self.add_request(
                 ticker=ticker,
                 strike=strike,
                 right=right,
+                expiration_date=expiration_date,
                 method='request_options_contract')
         
         contract = util.get_options_contract(ticker)
@@ -130,6 +147,7 @@ class IBData(EClient, EWrapper):
         contract.right = right
         
         self.reqMktData(next_req_id, contract, "", True, False, [])
+        return next_req_id
 
     def tickOptionComputation(self, reqId, tickType, impliedVol, delta,
                 optPrice, pvDividend, gamma, vega, theta, undPrice):
@@ -138,38 +156,70 @@ class IBData(EClient, EWrapper):
         if tickType != 11: # ask price
             return
 
-        calling_info = self.calling_info[reqId]
-        if calling_info.method == 'request_options_contract':
-            gcnv.options[calling_info.ticker].append({
-                                        'delta': delta,
-                                        'price': optPrice,
-                                        'strike': calling_info.strike, 
-                                        'right': calling_info.right})
+        calling_info = self.requests.stream(reqId)
+        if calling_info is not None and calling_info.method == 'request_options_contract':
+            self.incoming.put(("store_option_quote",
+                                (calling_info.ticker, calling_info.expiration_date,
+                                 calling_info.strike, calling_info.right,
+                                 delta, optPrice, time.time())))
 
     def error(self, reqId, errorCode:int, errorString:str):
         super().error(reqId, errorCode, errorString)
         logging.info(f"Bruno says: Error logged with reqId: {reqId}")
-        
-        self.calling_info.pop(reqId, None)
+
+        if fetcher.is_no_data(errorCode, errorString):
+            self.historicalDataEnd(reqId, "", "") # finished, its range is empty
+        else:
+            self.requests.fail(reqId, errorCode, errorString)
 
     # Async
 
-    def wait_for_async_request(self):
-        for i in range(20):
-            if len(self.calling_info) == 0:
-                return
-            time.sleep(1)
-        self.calling_info.clear()
-        raise GettingInfoError("Timeout while getting data")
+    # Waits until the requests with req_ids (all pending requests if None)
+    # end or reach their own timeout, and stores the data received
+    def wait_for_async_request(self, req_ids = None):
+        timed_out = []
+        while True:
+            if req_ids is None:
+                requests = self.requests.items()
+            else:
+                requests = [(req_id, self.requests.get(req_id)) for req_id in req_ids]
+            requests = [(req_id, info) for req_id, info in requests
+                            if info is not None and req_id not in timed_out]
+            if len(requests) == 0:
+                break
+            for req_id, info in requests:
+                if not info.done.wait(max(0, info.deadline - time.monotonic())):
+                    timed_out.append(req_id)
+        for req_id in timed_out:
+            self.requests.fail(req_id, error_string = "timeout")
+        self.ingest()
+        if len(timed_out) > 0:
+            raise GettingInfoError("Timeout while getting data")
+
+    # Stores the data received by the message loop thread. Must be called
+    # from the main thread, so only it changes the data handler
+    def ingest(self):
+        while True:
+            try:
+                method, args = self.incoming.get_nowait()
+            except Empty:
+                break
+            getattr(gcnv.data_handler, method)(*args)
 
     def wait_for_api_ready(self):
-        for i in range(120):
-            if self.api_ready:
-                break
-            else:
-                time.sleep(1)
+        self.api_ready_event.wait(gcnv.API_READY_TIMEOUT)
 
     # Private
+
+    # Registers a request with its info, to be finished by finish_request
+    def add_request(self, timeout = None, **info):
+        next_req_id = self.get_next_req_id()
+        timeout = gcnv.REQUEST_TIMEOUT if timeout is None else timeout
+        self.requests.add(next_req_id, timeout, **info)
+        return next_req_id
+
+    def finish_request(self, reqId):
+        self.requests.finish(reqId)
     
     def get_next_req_id(self, next = True):
         if next:
@@ -187,4 +237,5 @@ class IBData(EClient, EWrapper):
     def nextValidId(self, orderId:int):
         super().nextValidId(orderId)
         logging.info(f"Bruno says: App ready with orderId: {orderId}")
-        self.api_ready = True
\ No newline at end of file
+        self.api_ready = True
+        self.api_ready_event.set()
\ No newline at end of file
@@ -1,8 +1,21 @@
+import random
+from datetime import date, datetime, timedelta
+from threading import Timer
+
 from ib.ib_data import IBData
+from lib import core, trading_calendar
 
 # Instantiate this class in test mode from main.py
+# Historical data and snapshot requests are answered with synthetic data
+# after latency seconds. The first pacing_violations historical requests
+# are rejected, and historical requests of empty_tickers have no data
 class IBDataTest(IBData):
-    def __init__(self):
+    def __init__(self, latency = 0, pacing_violations = 0, silent_tickers = (),
+                    empty_tickers = ()):
+        self.latency = latency
+        self.pacing_violations = pacing_violations
+        self.silent_tickers = set(silent_tickers) # snapshots never tick
+        self.empty_tickers = set(empty_tickers)
         IBData.__init__(self)
         self.nextValidId(0)
 
@@ -10,16 +23,47 @@ class IBDataTest(IBData):
         pass # overwrite method for not doing anything
 
     def reqMktData(self, next_req_id, contract, some1, some2, some3, some4):
-        pass
+        if contract.secType != "OPT" and contract.symbol not in self.silent_tickers:
+            Timer(self.latency, self.replay_snapshot, (next_req_id, contract.symbol)).start()
 
     def run(self):
         pass
 
+    def reqHistoricalData(self, reqId, contract, endDateTime, durationStr,
+                barSizeSetting, whatToShow, useRTH, formatDate, keepUpToDate, chartOptions):
+        Timer(self.latency, self.replay_historical_data,
+                (reqId, contract.symbol, endDateTime, durationStr, whatToShow)).start()
+
+    def replay_historical_data(self, reqId, symbol, end_date_time, duration_string, what_to_show):
+        if self.pacing_violations > 0:
+            self.pacing_violations -= 1
+            self.error(reqId, 162, "Historical Market Data Service error message:"
+                                    "API historical data query cancelled: pacing violation")
+            return
+        if symbol in self.empty_tickers:
+            self.error(reqId, 162, "Historical Market Data Service error message:"
+                                    "HMDS query returned no data")
+            return
+        amount, unit = duration_string.split()
+        days = int(amount) * {"D": 1, "W": 7, "M": 30, "Y": 365}[unit]
+        end = (date.today() if end_date_time == ''
+                else datetime.strptime(end_date_time[:8], "%Y%m%d").date())
+        generator = random.Random(f"{symbol},{what_to_show},{end}")
+        close = 0.3 if "VOLATILITY" in what_to_show else 100
+        for day in trading_calendar.trading_days(end - timedelta(days = days - 1), end):
+            close *= 1 + generator.gauss(0, 0.02)
+            self.historicalData(reqId, core.Struct(date=day.strftime("%Y%m%d"), close=close))
+        self.historicalDataEnd(reqId, "", "")
+
+    def replay_snapshot(self, reqId, symbol):
+        self.tickPrice(reqId, 4, random.Random(symbol).uniform(10, 500), None)
+        self.tickSnapshotEnd(reqId)
+
     # Here methods that need to be tested
 
     def request_options_contract(self, ticker, strike, right, expiration_date):
-        super().request_options_contract(ticker, strike, right, expiration_date)
-        reqId = list(self.calling_info.keys())[0]
+        reqId = super().request_options_contract(ticker, strike, right, expiration_date)
         self.tickOptionComputation(
             reqId, 11, None, 0.5, 12.02, None, None, None, None, None)
-        self.tickSnapshotEnd(reqId)
\ No newline at end of file
+        self.tickSnapshotEnd(reqId)
+        return reqId
\ No newline at end of file
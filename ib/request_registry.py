@@ -0,0 +1,84 @@
+import time
+from threading import Event, Lock
+
+from lib import core
+
+# Request states
+PENDING = "pending" # sent, nothing received yet
+STREAMING = "streaming" # receiving data
+DONE = "done"
+FAILED = "failed" # error or timeout
+
+# Requests waiting for an answer, shared by the thread sending them and the
+# message loop thread answering them. Infos are removed when the request
+# ends (done, failed or timed out), their done event is set and listeners are
+# called with (req_id, info): callers needing the final state keep the info
+# or listen, nothing is kept for ended requests
+class RequestRegistry:
+    def __init__(self):
+        self.lock = Lock()
+        self.requests = {}
+        self.listeners = []
+
+    def __contains__(self, req_id):
+        with self.lock:
+            return req_id in self.requests
+
+    def __len__(self):
+        with self.lock:
+            return len(self.requests)
+
+    def add(self, req_id, timeout, **info):
+        info = core.Struct(done=Event(), deadline=time.monotonic() + timeout,
+                            state=PENDING, **info)
+        with self.lock:
+            self.requests[req_id] = info
+        return info
+
+    # None if the request already ended
+    def get(self, req_id):
+        with self.lock:
+            return self.requests.get(req_id)
+
+    # Pending requests, as (req_id, info)
+    def items(self):
+        with self.lock:
+            return list(self.requests.items())
+
+    # Marks the request as receiving data, returns its info or None if ended
+    def stream(self, req_id):
+        with self.lock:
+            info = self.requests.get(req_id)
+            if info is not None and info.state == PENDING:
+                info.state = STREAMING
+        return info
+
+    def finish(self, req_id):
+        return self.end(req_id, DONE)
+
+    def fail(self, req_id, error_code = None, error_string = None):
+        return self.end(req_id, FAILED, error_code = error_code, error_string = error_string)
+
+    def add_listener(self, listener):
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self.lock:
+            self.listeners.remove(listener)
+
+    # Private
+
+    def end(self, req_id, state, **details):
+        with self.lock:
+            info = self.requests.pop(req_id, None)
+            if info is None:
+                return None
+            info.state = state
+            for key, value in details.items():
+                setattr(info, key, value)
+            listeners = list(self.listeners)
+        info.done.set()
+        for listener in listeners:
+            listener(req_id, info)
+        return info
@@ -0,0 +1,72 @@
+import http.client
+import json
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import gcnv
+
+# Brings the earnings dates of many tickers from the nasdaq api with a pool
+# of workers. Each worker keeps its own connection alive between requests,
+# and failed requests are retried after a backoff
+class EarningsScraper:
+    def __init__(self, base_url = None, workers = None, timeout = None, retries = None):
+        self.base_url = urllib.parse.urlsplit(gcnv.EARNINGS_URL if base_url is None else base_url)
+        self.workers = gcnv.EARNINGS_WORKERS if workers is None else workers
+        self.timeout = gcnv.EARNINGS_TIMEOUT if timeout is None else timeout
+        self.retries = gcnv.EARNINGS_RETRIES if retries is None else retries
+        self.local = threading.local()
+
+    # Yields (ticker, earnings text or None, message) as results arrive
+    def scrape(self, tickers):
+        with ThreadPoolExecutor(self.workers) as executor:
+            futures = [executor.submit(self.scrape_ticker, ticker) for ticker in tickers]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def scrape_ticker(self, ticker):
+        try:
+            response = json.loads(self.get(f"/api/analyst/{ticker}/earnings-date"))
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            return ticker, None, f"Couldn't get earnings for {ticker}: {e}"
+        if not response.get('data'):
+            return ticker, None, f"No data for {ticker}"
+        data = response['data']['reportText']
+        location = data.find('earnings on')
+        if location == -1:
+            return ticker, None, f"Couldn't find earnings for {ticker}"
+        return ticker, data[location+13:location+25], f"Stored earnings for {ticker}"
+
+    # Private
+
+    def get(self, path):
+        path = self.base_url.path.rstrip('/') + path
+        for attempt in range(self.retries + 1):
+            try:
+                connection = self.connection()
+                connection.request("GET", path, headers = {
+                        "User-Agent": "Mozilla/5.0", "Accept": "application/json"})
+                response = connection.getresponse()
+                body = response.read()
+                if response.status >= 500:
+                    raise http.client.HTTPException(f"HTTP {response.status}")
+                return body
+            except (OSError, http.client.HTTPException):
+                self.close()
+                if attempt == self.retries:
+                    raise
+                time.sleep(0.5 * 2 ** attempt)
+
+    def connection(self):
+        if getattr(self.local, 'connection', None) is None:
+            connection_class = (http.client.HTTPSConnection if self.base_url.scheme == "https"
+                                else http.client.HTTPConnection)
+            self.local.connection = connection_class(self.base_url.netloc, timeout = self.timeout)
+        return self.local.connection
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
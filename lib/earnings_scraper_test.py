@@ -0,0 +1,65 @@
+import json
+import random
+import time
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+
+# Local stand-in of the earnings api, started in test mode from main.py.
+# Answers after latency seconds with a date derived from the ticker, and
+# the first failures requests with an error
+class EarningsServerTest:
+    def __init__(self, latency = 0, failures = 0):
+        self.latency = latency
+        self.failures = failures
+        self.requests = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        Thread(target = self.server.serve_forever, daemon = True).start()
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # Private
+
+    def handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep alive
+
+            def do_GET(self):
+                time.sleep(stand_in.latency)
+                stand_in.requests += 1
+                if stand_in.failures > 0:
+                    stand_in.failures -= 1
+                    self.reply(503, {})
+                    return
+                parts = self.path.strip('/').split('/')
+                if len(parts) != 4 or parts[:2] != ["api", "analyst"]:
+                    self.reply(404, {"data": None})
+                    return
+                ticker = parts[2]
+                day = date.today() + timedelta(days = random.Random(ticker).randint(-20, 80))
+                self.reply(200, {"data": {"reportText":
+                    f"{ticker} is expected to report earnings on  "
+                    f"{day.strftime('%m/%d/%Y')} after market close."}})
+
+            def reply(self, status, content):
+                body = json.dumps(content).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
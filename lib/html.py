@@ -194,9 +194,8 @@ class TableRow (object):
         if self.bgcolor: self.attribs['bgcolor'] = self.bgcolor
         for attr in self.attribs:
             attribs_str += ' %s="%s"' % (attr, self.attribs[attr])
-        result = ' <TR%s>\n' % attribs_str
-        for cell in self.cells:
-            col = self.cells.index(cell)    # cell column index
+        result = [' <TR%s>\n' % attribs_str]
+        for col, cell in enumerate(self.cells):
             if not isinstance(cell, TableCell):
                 cell = TableCell(cell, header=self.header)
             # apply column alignment if specified:
@@ -211,9 +210,9 @@ class TableRow (object):
             # apply column style if specified:
             if self.col_styles and cell.style==None:
                 cell.style = self.col_styles[col]
-            result += str(cell)
-        result += ' </TR>\n'
-        return result
+            result.append(str(cell))
+        result.append(' </TR>\n')
+        return ''.join(result)
 
 #-------------------------------------------------------------------------------
 
@@ -416,6 +415,62 @@ def table(*args, **kwargs):
     'return HTML code for a table as a string. See Table class for parameters.'
     return str(Table(*args, **kwargs))
 
+def write_table(f, rows, header_row=None, formatter=None, border='1', style=None,
+                width=None, cellspacing=None, cellpadding=4, attribs=None,
+                col_width=None, col_align=None, col_valign=None, col_char=None,
+                col_charoff=None, col_styles=None):
+    """
+    write the HTML code for a table to the file f, one row at a time, with
+    the same markup as Table. formatter(column, value), if given, returns the
+    text of each data cell. Column attributes are computed once per table.
+    """
+    if style == None: style = TABLE_STYLE_THINBORDER
+    attribs = dict(attribs or {})
+    if border: attribs['border'] = border
+    if style:  attribs['style'] = style
+    if width:  attribs['width'] = width
+    if cellspacing:  attribs['cellspacing'] = cellspacing
+    if cellpadding:  attribs['cellpadding'] = cellpadding
+    f.write('<TABLE%s>\n' % ''.join(' %s="%s"' % item for item in attribs.items()))
+    if col_width:
+        for col_w in col_width:
+            f.write('  <COL width="%s">\n' % col_w)
+    if header_row:
+        f.write(str(header_row if isinstance(header_row, TableRow)
+                    else TableRow(header_row, header=True)))
+
+    col_attributes = (('align', col_align), ('char', col_char),
+                      ('charoff', col_charoff), ('valign', col_valign),
+                      ('style', col_styles))
+    col_attributes = [(name, values) for name, values in col_attributes if values]
+    cell_starts = {} # column -> '  <TD attributes>'
+    def cell_start(col):
+        if col not in cell_starts:
+            cell_starts[col] = '  <TD%s>' % ''.join(' %s="%s"' % (name, values[col])
+                                for name, values in col_attributes if values[col])
+        return cell_starts[col]
+
+    for row in rows:
+        if isinstance(row, TableRow):
+            f.write(str(row))
+            continue
+        parts = [' <TR>\n']
+        for col, value in enumerate(row):
+            if isinstance(value, TableCell):
+                for name, values in col_attributes:
+                    if getattr(value, name) == None:
+                        setattr(value, name, values[col])
+                parts.append(str(value))
+                continue
+            if formatter:
+                value = formatter(col, value)
+            # An empty cell should at least contain a non-breaking space
+            text = '&nbsp;' if value is None else str(value)
+            parts.append('%s%s</TD>\n' % (cell_start(col), text))
+        parts.append(' </TR>\n')
+        f.write(''.join(parts))
+    f.write('</TABLE>')
+
 def list(*args, **kwargs):
     'return HTML code for a list as a string. See List class for parameters.'
     return str(List(*args, **kwargs))
@@ -0,0 +1,129 @@
+import csv
+import json
+import math
+import struct
+
+from lib import html
+from lib.errors import *
+
+# Report writers for the (header, rows) tables of the commands.
+# Data formats keep numbers as numbers and skip the "**" separator rows
+
+SEPARATOR = "**"
+
+# Same report as always: floats with 2 decimals, sort column in bold
+class HtmlOutput:
+    extension = ".html"
+    mode = "w"
+
+    def write(self, f, header, rows, order_column = None):
+        html.write_table(f, rows, header_row=header,
+            formatter=lambda i, value: format_cell(value, i == order_column),
+            style=("border: 1px solid #000000; border-collapse: collapse;"
+                    "font: 11px arial, sans-serif;"))
+
+class CsvOutput:
+    extension = ".csv"
+    mode = "w"
+
+    def write(self, f, header, rows, order_column = None):
+        writer = csv.writer(f, lineterminator = "\n")
+        writer.writerow(header)
+        writer.writerows(data_rows(rows))
+
+# One JSON object per row, keyed by the (unique) column names
+class JsonLinesOutput:
+    extension = ".jsonl"
+    mode = "w"
+
+    def write(self, f, header, rows, order_column = None):
+        names = unique_names(header)
+        for row in data_rows(rows):
+            f.write(json.dumps(dict(zip(names, (json_value(value) for value in row)))))
+            f.write("\n")
+
+# Columnar typed table, in little endian:
+#   magic (4 bytes) + columns count (uint32) + rows count (uint32)
+#   per column: name length (uint16) + utf-8 name + type (1 byte)
+#   per column, its values:
+#     'd': float64 each, NaN when missing
+#     'q': int64 each
+#     's': length (uint32) + utf-8 text each
+class BinaryOutput:
+    extension = ".bin"
+    mode = "wb"
+    MAGIC = b"GCT1"
+
+    def write(self, f, header, rows, order_column = None):
+        rows = list(data_rows(rows))
+        names = unique_names(header)
+        columns = [[row[i] if i < len(row) else None for row in rows]
+                    for i in range(len(names))]
+        types = [column_type(column) for column in columns]
+        f.write(self.MAGIC + struct.pack("<II", len(names), len(rows)))
+        for name, column_type_code in zip(names, types):
+            encoded = name.encode()
+            f.write(struct.pack("<H", len(encoded)) + encoded + column_type_code.encode())
+        for column, column_type_code in zip(columns, types):
+            if column_type_code == 'd':
+                f.write(struct.pack(f"<{len(column)}d",
+                        *(math.nan if not is_number(value) else value for value in column)))
+            elif column_type_code == 'q':
+                f.write(struct.pack(f"<{len(column)}q", *column))
+            else:
+                for value in column:
+                    encoded = ("" if value is None else str(value)).encode()
+                    f.write(struct.pack("<I", len(encoded)) + encoded)
+
+OUTPUTS = {
+    'html': HtmlOutput,
+    'csv': CsvOutput,
+    'jsonl': JsonLinesOutput,
+    'bin': BinaryOutput
+}
+
+def get_output(output_format):
+    try:
+        return OUTPUTS[output_format]()
+    except KeyError:
+        raise InputError(f"Unknown output format '{output_format}', "
+                         f"use one of: {', '.join(OUTPUTS)}")
+
+def format_cell(value, bold):
+    if isinstance(value, float):
+        value = f"{value:.2f}"
+    return f"<b>{value}</b>" if bold else value
+
+# Private
+
+def data_rows(rows):
+    return (row for row in rows if not all(value == SEPARATOR for value in row))
+
+# Repeated names (eg. '-') get a number: '-', '-2', '-3'...
+def unique_names(header):
+    names = []
+    counts = {}
+    for name in header:
+        name = str(name)
+        counts[name] = counts.get(name, 0) + 1
+        names.append(name if counts[name] == 1 else f"{name}{counts[name]}")
+    return names
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+# Numbers with some missing values ('-', None...) are stored as floats
+def column_type(column):
+    numbers = [value for value in column if is_number(value)]
+    if len(numbers) == 0:
+        return 's'
+    if len(numbers) == len(column) and all(isinstance(value, int) for value in numbers):
+        return 'q'
+    if all(is_number(value) or value in (None, '-', '') for value in column):
+        return 'd'
+    return 's'
+
+def json_value(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
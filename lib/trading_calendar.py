@@ -0,0 +1,98 @@
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+
+# NYSE trading calendar (full day closures only)
+
+# Unscheduled closures
+SPECIAL_CLOSURES = {
+    date(2012, 10, 29), date(2012, 10, 30), # Hurricane Sandy
+    date(2018, 12, 5), # George H. W. Bush national day of mourning
+    date(2025, 1, 9) # Jimmy Carter national day of mourning
+}
+
+def is_trading_day(day):
+    if isinstance(day, datetime):
+        day = day.date()
+    return day.weekday() < 5 and day not in holidays(day.year)
+
+# Trading days between start and end (both included), oldest first
+def trading_days(start, end):
+    if isinstance(start, datetime):
+        start = start.date()
+    if isinstance(end, datetime):
+        end = end.date()
+    days = []
+    day = start
+    while day <= end:
+        if is_trading_day(day):
+            days.append(day)
+        day += timedelta(days = 1)
+    return days
+
+# day if it's a trading day, otherwise the previous one
+def latest_trading_day(day):
+    if isinstance(day, datetime):
+        day = day.date()
+    return day if is_trading_day(day) else previous_trading_day(day)
+
+def previous_trading_day(day):
+    if isinstance(day, datetime):
+        day = day.date()
+    day -= timedelta(days = 1)
+    while not is_trading_day(day):
+        day -= timedelta(days = 1)
+    return day
+
+@lru_cache(maxsize=None)
+def holidays(year):
+    days = {
+        nth_weekday(year, 1, 0, 3), # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3), # Washington's Birthday
+        easter(year) - timedelta(days = 2), # Good Friday
+        last_weekday(year, 5, 0), # Memorial Day
+        observed(date(year, 7, 4)), # Independence Day
+        nth_weekday(year, 9, 0, 1), # Labor Day
+        nth_weekday(year, 11, 3, 4), # Thanksgiving Day
+        observed(date(year, 12, 25)) # Christmas
+    }
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5: # not moved to the previous year when saturday
+        days.add(observed(new_year))
+    if year >= 2022:
+        days.add(observed(date(year, 6, 19))) # Juneteenth
+    days.update(day for day in SPECIAL_CLOSURES if day.year == year)
+    return days
+
+# Private
+
+# Saturday holidays are moved to friday and sunday ones to monday
+def observed(day):
+    if day.weekday() == 5:
+        return day - timedelta(days = 1)
+    elif day.weekday() == 6:
+        return day + timedelta(days = 1)
+    return day
+
+# weekday: 0 is monday. nth: 1 is the first one
+def nth_weekday(year, month, weekday, nth):
+    first = date(year, month, 1)
+    return first + timedelta(days = (weekday - first.weekday()) % 7 + 7 * (nth - 1))
+
+def last_weekday(year, month, weekday):
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    last = next_month - timedelta(days = 1)
+    return last - timedelta(days = (last.weekday() - weekday) % 7)
+
+# Anonymous gregorian algorithm
+def easter(year):
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
@@ -14,10 +14,11 @@ import controllers.correlations as correlations_controller
 import controllers.show as show_controller
 
 import gcnv
-from lib import html
+from lib import output
 from ib.ib_data import IBData
 
 from ib.ib_data_test import IBDataTest
+from lib.earnings_scraper_test import EarningsServerTest
 
 # INITIALIZATION
 # Detects if it is executed as the main file/import OR through a console exec to 
@@ -37,10 +38,15 @@ parameters = sys.argv + 5 * ['']
 test = 'test' in parameters
 batch = 'batch' in parameters
 
+if test:
+    gcnv.EARNINGS_URL = EarningsServerTest().url
 if parameters[1] == "connect":
     gcnv.ib = IBData() if not test else IBDataTest()
     gcnv.ib.wait_for_api_ready()
 gcnv.data_handler = DataHandler()
+if gcnv.WARM_UP_LIST:
+    gcnv.data_handler.warm_up(
+        util.read_symbol_list(f"{gcnv.APP_PATH}/input/{gcnv.WARM_UP_LIST}.txt"))
 gcnv.messages = []
 gcnv.v_tickers = set(util.read_symbol_list(f"{gcnv.APP_PATH}/input/options.txt"))
 gcnv.store_dir = "/media/ramd"
@@ -67,6 +73,11 @@ if __name__ == "__main__" and not exec_in_console:
             continue
 
         command = command.split()
+        # 'out:<format>' anywhere in the command selects the report format
+        output_format = gcnv.OUTPUT_FORMAT
+        for token in [token for token in command if token.startswith("out:")]:
+            output_format = token[len("out:"):]
+            command.remove(token)
         # adding empty strings to the list to make it easier to manage the command
         command += [""] * 5
 
@@ -78,8 +89,11 @@ if __name__ == "__main__" and not exec_in_console:
         else:
             last_command = command
 
-        header = rows = None
+        header = rows = order_column = None
         try:
+            # before running the command, that can take minutes
+            report = output.get_output(output_format)
+
             if command[0] == "exit" or command[0] == "e":
                 gcnv.data_handler.save()
                 if gcnv.ib:
@@ -87,6 +101,7 @@ if __name__ == "__main__" and not exec_in_console:
                 break
 
             elif command[0] == "e!":
+                gcnv.data_handler.discard()
                 if gcnv.ib:
                     gcnv.ib.disconnect()
                 break
@@ -103,6 +118,8 @@ if __name__ == "__main__" and not exec_in_console:
             elif command[0] == "chart":
                 if command[1] == "pair":
                     general_controller.chart_pair(command)
+                elif command[1] == "ivr":
+                    general_controller.chart_iv_rank(command)
 
             elif command[0] == "print":
                 if command[1] == "price":
@@ -119,10 +136,16 @@ if __name__ == "__main__" and not exec_in_console:
             elif command[0] == "pair":
                 header, rows, order_column = pairs_controller.table(command)
 
+            elif command[0] == "ivr":
+                header, rows = iv_controller.rank_history(command)
+
             elif command[0] == "update":
                 print("Updating stock values...")
                 general_controller.update_stock(command)
 
+            elif command[0] == "convert":
+                general_controller.convert(command)
+
             elif command[0] == "earnings":
                 general_controller.save_earnings(command)
 
@@ -139,23 +162,18 @@ if __name__ == "__main__" and not exec_in_console:
 
             if header and rows:
                 command = filter(lambda p: p != '', command)
-                with open(f"{gcnv.store_dir}/{'-'.join(command)}.html", "w") as f:
-                    for row in rows:
-                        for i in range(len(row)):
-                            if isinstance(row[i], float):
-                                row[i] = f"{row[i]:.2f}"
-                            if vars().get("order_column") == i:
-                                row[i] = f"<b>{row[i]}</b>"
-                    f.write(html.table(rows, header_row=header,
-                        style=("border: 1px solid #000000; border-collapse: collapse;"
-                                "font: 11px arial, sans-serif;")))
+                with open(f"{gcnv.store_dir}/{'-'.join(command)}{report.extension}",
+                            report.mode) as f:
+                    report.write(f, header, rows, order_column)
                 print(f"Finished. Stored report on {gcnv.store_dir}.")
 
+            gcnv.data_handler.flush()
+
             if len(gcnv.messages) > 0:
                 print("\n".join(gcnv.messages))
                 gcnv.messages = []
 
-        except GettingInfoError as e:
+        except (GettingInfoError, InputError) as e:
             print(e)
 
         except FileNotFoundError as e:
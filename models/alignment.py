@@ -0,0 +1,135 @@
+from bisect import bisect_left
+from heapq import merge
+
+from lib import trading_calendar
+from models.series import date_to_int, int_to_date
+
+# Alignment of several (dates, values) windows on a common date index.
+# Windows must be sorted by date, as returned by Series.window.
+# Policies:
+INNER = "inner" # dates stored in every window
+FFILL = "ffill" # dates stored in any window, gaps filled with the previous value
+DROP = "drop" # trading calendar dates, dropped if any window is missing
+SUFFIX_POLICIES = (INNER, DROP) # shorter windows are a suffix of the wider one
+
+class Alignment:
+    def __init__(self, dates, columns, windows, start, end):
+        self.dates = dates
+        self.columns = columns # one list of values per window
+        self.windows = windows
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return len(self.dates)
+
+    # Trading dates between start and end not stored in every window,
+    # most recent first
+    def missing_dates(self):
+        missing_dates = []
+        if self.start is None:
+            return missing_dates
+        for day in reversed(trading_calendar.trading_days(
+                                int_to_date(self.start), int_to_date(self.end))):
+            date = date_to_int(day)
+            for dates, _ in self.windows:
+                i = bisect_left(dates, date)
+                if i == len(dates) or dates[i] != date:
+                    missing_dates.append(date)
+                    break
+        return missing_dates
+
+    # Alignment of the dates from start on. For INNER and DROP it's the same
+    # as aligning the windows cut at start
+    def suffix(self, start):
+        if self.start is None or start <= self.start:
+            return self
+        k = bisect_left(self.dates, start)
+        windows = [(dates[bisect_left(dates, start):], values[bisect_left(dates, start):])
+                    for dates, values in self.windows]
+        return Alignment(self.dates[k:], [column[k:] for column in self.columns],
+                    windows, start, self.end)
+
+# start and end delimit the DROP calendar and the missing dates, by default
+# the first and last dates of the windows
+def align(windows, policy = INNER, start = None, end = None):
+    if start is None:
+        start = min((dates[0] for dates, _ in windows if len(dates) > 0), default = None)
+    if end is None:
+        end = max((dates[-1] for dates, _ in windows if len(dates) > 0), default = None)
+    if start is not None:
+        start, end = date_to_int(start), date_to_int(end)
+    if policy == INNER:
+        dates, columns = inner_join(windows)
+    elif policy == FFILL:
+        dates, columns = forward_fill(windows)
+    elif policy == DROP:
+        dates, columns = ([], [[] for _ in windows]) if start is None \
+                            else calendar_join(windows, start, end)
+    else:
+        raise RuntimeError(f"Unknown alignment policy: {policy}")
+    return Alignment(dates, columns, windows, start, end)
+
+# Private
+
+# Sorted merge: every window jumps (binary search) to the most recent of the
+# current dates until all of them point to the same one
+def inner_join(windows):
+    if len(windows) == 1:
+        dates, values = windows[0]
+        return list(dates), [list(values)]
+    positions = [0] * len(windows)
+    dates = []
+    columns = [[] for _ in windows]
+    while all(position < len(window[0])
+                for position, window in zip(positions, windows)):
+        current = [window[0][position] for position, window in zip(positions, windows)]
+        latest = max(current)
+        if min(current) == latest:
+            dates.append(latest)
+            for k, (_, values) in enumerate(windows):
+                columns[k].append(values[positions[k]])
+                positions[k] += 1
+        else:
+            for k, (window_dates, _) in enumerate(windows):
+                if current[k] < latest:
+                    positions[k] = bisect_left(window_dates, latest, positions[k])
+    return dates, columns
+
+def forward_fill(windows):
+    positions = [0] * len(windows)
+    last_values = [None] * len(windows)
+    dates = []
+    columns = [[] for _ in windows]
+    previous = None
+    for date in merge(*(window_dates for window_dates, _ in windows)):
+        if date == previous:
+            continue
+        previous = date
+        for k, (window_dates, values) in enumerate(windows):
+            if positions[k] < len(window_dates) and window_dates[positions[k]] == date:
+                last_values[k] = values[positions[k]]
+                positions[k] += 1
+        if all(value is not None for value in last_values): # every window started
+            dates.append(date)
+            for k, value in enumerate(last_values):
+                columns[k].append(value)
+    return dates, columns
+
+def calendar_join(windows, start, end):
+    positions = [0] * len(windows)
+    dates = []
+    columns = [[] for _ in windows]
+    for day in trading_calendar.trading_days(int_to_date(start), int_to_date(end)):
+        date = date_to_int(day)
+        row = []
+        for k, (window_dates, values) in enumerate(windows):
+            positions[k] = bisect_left(window_dates, date, positions[k])
+            if positions[k] == len(window_dates) or window_dates[positions[k]] != date:
+                break
+            row.append(values[positions[k]])
+        else:
+            dates.append(date)
+            for k, value in enumerate(row):
+                columns[k].append(value)
+    return dates, columns
@@ -0,0 +1,78 @@
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+import gcnv
+
+# Session wide cache of model calculations, shared by every instance of the
+# models so rows of a table reuse the results of the others (eg. SPY stdev).
+# Entries are keyed by (metric, instance key, arguments, data versions),
+# evicted least recently used when over max_size, and dropped when
+# DataHandler changes one of the series they depend on
+class AnalyticsCache:
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.dependents = defaultdict(set) # (document, ticker) -> keys
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Raises KeyError if not cached
+    def get(self, key):
+        try:
+            value, _ = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            raise
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, dependencies):
+        self.entries[key] = (value, dependencies)
+        self.entries.move_to_end(key)
+        for dependency in dependencies:
+            self.dependents[dependency].add(key)
+        while len(self.entries) > self.max_size:
+            evicted_key, (_, evicted_dependencies) = self.entries.popitem(last = False)
+            for dependency in evicted_dependencies:
+                self.dependents[dependency].discard(evicted_key)
+
+    def invalidate(self, document, ticker):
+        for key in self.dependents.pop((document, ticker), ()):
+            _, dependencies = self.entries.pop(key)
+            for dependency in dependencies:
+                if dependency != (document, ticker):
+                    self.dependents[dependency].discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.dependents.clear()
+
+def get_cache():
+    if gcnv.analytics_cache is None:
+        gcnv.analytics_cache = AnalyticsCache(gcnv.ANALYTICS_CACHE_SIZE)
+    return gcnv.analytics_cache
+
+# Method decorator. The instance must implement cache_key(), identifying the
+# instrument, and dependencies(), the (document, ticker) series it reads
+def cached(method):
+    name = method.__qualname__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = get_cache()
+        dependencies = self.dependencies()
+        key = (name, self.cache_key(), args, tuple(sorted(kwargs.items())),
+                tuple(gcnv.data_handler.version(*dependency)
+                        for dependency in dependencies))
+        try:
+            return cache.get(key)
+        except KeyError:
+            pass
+        value = method(self, *args, **kwargs)
+        cache.put(key, value, dependencies)
+        return value
+    return wrapper
@@ -0,0 +1,77 @@
+from lib.errors import *
+from models import engine, alignment
+import gcnv
+
+# Correlations, betas and volatility ratios between many tickers.
+# Every pair uses the back_days window ending at the older of its two last
+# stored dates, the same window Pair gets from list_data. Stock windows are
+# read once per ticker and end date, and tickers with every date of the
+# tickers stored up to that end date share their changes and stdevs with
+# all their pairs. Pairs with gaps fall back to the dates both have stored
+class CorrelationMatrix:
+    def __init__(self, tickers, back_days):
+        self.back_days = back_days
+        self.last_dates = {ticker: gcnv.data_handler.get_max_stored_date("stock", ticker)
+                            for ticker in tickers}
+        self.windows = {} # (ticker, end date) -> (dates, closes)
+        self.changes = {} # end date -> {ticker: changes}, only complete tickers
+        self.stdevs = {} # (ticker, end date) -> stdev of the complete changes
+
+    def correlation(self, ticker1, ticker2):
+        end_date, changes1, changes2 = self.parallel_percentage_changes(ticker1, ticker2)
+        return (engine.get().covariance(changes1, changes2)
+                / (self.stdev(ticker1, end_date, changes1)
+                    * self.stdev(ticker2, end_date, changes2)))
+
+    def stdev_ratio(self, ticker1, ticker2):
+        end_date, changes1, changes2 = self.parallel_percentage_changes(ticker1, ticker2)
+        return (self.stdev(ticker1, end_date, changes1)
+                / self.stdev(ticker2, end_date, changes2))
+
+    def beta(self, ticker1, ticker2):
+        return self.correlation(ticker1, ticker2) * self.stdev_ratio(ticker1, ticker2)
+
+    # Private
+
+    def parallel_percentage_changes(self, ticker1, ticker2):
+        if self.last_dates.get(ticker1) is None or self.last_dates.get(ticker2) is None:
+            raise GettingInfoError(f"No pairs data for {ticker1}-{ticker2}")
+        end_date = min(self.last_dates[ticker1], self.last_dates[ticker2])
+        complete = self.complete_changes(end_date)
+        if ticker1 in complete and ticker2 in complete:
+            return end_date, complete[ticker1], complete[ticker2]
+        aligned = alignment.align([self.window(ticker1, end_date),
+                                    self.window(ticker2, end_date)])
+        if len(aligned) == 0:
+            raise GettingInfoError(f"No pairs data for {ticker1}-{ticker2}")
+        closes1, closes2 = aligned.columns
+        return (end_date, engine.get().percentage_changes(closes1),
+                engine.get().percentage_changes(closes2))
+
+    def window(self, ticker, end_date):
+        if (ticker, end_date) not in self.windows:
+            self.windows[(ticker, end_date)] = gcnv.data_handler.get_window(
+                                                "stock", ticker, end_date, self.back_days)
+        return self.windows[(ticker, end_date)]
+
+    # Changes of the tickers stored up to end_date that have every date
+    # any of them has in the window
+    def complete_changes(self, end_date):
+        if end_date not in self.changes:
+            windows = {ticker: self.window(ticker, end_date)
+                        for ticker, last_date in self.last_dates.items()
+                        if last_date is not None and last_date >= end_date}
+            dates = set().union(*(dates for dates, _ in windows.values()))
+            self.changes[end_date] = {
+                ticker: engine.get().percentage_changes(closes)
+                for ticker, (ticker_dates, closes) in windows.items()
+                if len(ticker_dates) == len(dates)}
+        return self.changes[end_date]
+
+    # The stdev of complete tickers is shared by all their pairs
+    def stdev(self, ticker, end_date, changes):
+        if changes is not self.changes[end_date].get(ticker):
+            return engine.get().stdev(changes)
+        if (ticker, end_date) not in self.stdevs:
+            self.stdevs[(ticker, end_date)] = engine.get().stdev(changes)
+        return self.stdevs[(ticker, end_date)]
@@ -1,57 +1,240 @@
-import json
-from json.decoder import JSONDecodeError
 from datetime import datetime, timedelta
-import os
+from threading import Thread, Event
+from collections import defaultdict, OrderedDict
+import time
 
-from lib import util
+from lib import util, trading_calendar
 from lib.errors import *
-from ib.ib_data import IBData
+from models.series import Series, date_to_int, int_to_date
+from models.document import Document
+from models.storage import get_storage, OptionsStorage
+from models.option_chain import OptionChain
+from models.journal import Journal
+from models import alignment
+from ib import fetch_planner
 
 import gcnv
 
 DOCUMENTS = ['iv', 'hv', 'stock']
+ALIGNMENTS_SIZE = 32
 
 class DataHandler:
-    def __init__(self):
-        self.modified = set()
+    def __init__(self, lazy = None):
+        self.pending = defaultdict(list) # journal operations not applied yet
+        self.date_index = {} # (document, ticker) -> first/last stored dates
+        self.versions = defaultdict(int) # (document, ticker) -> changes count
+        self.alignments = OrderedDict() # widest list_data alignments, see get_alignment
+        self.empty_ranges = defaultdict(list) # (document, ticker) -> [(first, last)] not brought
+        self.lazy = gcnv.LAZY_LOAD if lazy is None else lazy
+        self.storage = get_storage(gcnv.DATA_FORMAT)
+        self.options_storage = OptionsStorage()
+        self.options_modified = set()
+        self.journal = Journal(f"{gcnv.APP_PATH}/data/journal.log")
+        self.warm_up_thread = None
+        self.warm_up_stop = Event()
         self.load()
 
+    # In lazy mode only the file names are indexed here, series are parsed
+    # the first time they are accessed. Operations in the journal are applied
+    # to each series when it's loaded
     def load(self):
         for document in DOCUMENTS:
-            data = {}
-            filenames = os.listdir(f"{gcnv.APP_PATH}/data/{document}")
-            tickers = [filename.replace('.json', '')
-                        for filename in filenames 
-                        if '.json' in filename] # could add file checking also
-            for ticker in tickers:
-                with open(f"{gcnv.APP_PATH}/data/{document}/{ticker}.json", "r") as f:
-                    data[ticker] = json.load(f)
-            setattr(self, document, data)
+            setattr(self, document, Document(document,
+                        self.storage.tickers(document),
+                        lambda ticker, document=document: self.load_series(document, ticker),
+                        lazy = True))
+        self.options = Document("options", self.options_storage.tickers("options"),
+                        lambda ticker: self.options_storage.read("options", ticker))
+        for operation in self.journal.read():
+            self.index_operation(operation)
+        if not self.lazy:
+            for document in DOCUMENTS:
+                getattr(self, document).items()
 
+    # Loads the tickers in a background thread so they are ready when needed
+    def warm_up(self, tickers):
+        self.warm_up_stop.clear()
+        self.warm_up_thread = Thread(target = self.load_tickers,
+                                args = (tickers, self.warm_up_stop), daemon = True)
+        self.warm_up_thread.start()
+        return self.warm_up_thread
+
+    # Waits for the warm up thread to finish the ticker it's loading and stops
+    # it. Needed before forking: a child forked while the thread holds a
+    # Document lock would wait for it forever
+    def stop_warm_up(self):
+        if self.warm_up_thread is None:
+            return
+        self.warm_up_stop.set()
+        self.warm_up_thread.join()
+        self.warm_up_thread = None
+
+    def load_tickers(self, tickers, stop = None):
+        for ticker in tickers:
+            if stop is not None and stop.is_set():
+                return
+            for document in DOCUMENTS:
+                getattr(self, document).load(ticker)
+
+    # Changes are already in the journal, data files are only rewritten
+    # when it grows over gcnv.JOURNAL_COMPACT_SIZE
     def save(self):
-        for document in DOCUMENTS:
-            data = getattr(self, document)
-            for ticker in data.keys():
-                if (document, ticker) not in self.modified:
-                    continue
-                with open(f"{gcnv.APP_PATH}/data/{document}/{ticker}.json", "w") as f:
-                    json.dump(data[ticker], f)
+        self.flush()
+        if self.journal.size() > gcnv.JOURNAL_COMPACT_SIZE:
+            self.compact()
+
+    def flush(self):
+        self.journal.flush()
+        for ticker in self.options_modified:
+            self.options_storage.write("options", ticker, self.options[ticker])
+        self.options_modified = set()
+
+    # Applies the operations in the journal, from every process, to the data
+    # files and empties it. The journal is locked meanwhile, so operations
+    # other processes flush wait for the next compaction
+    def compact(self):
+        self.journal.flush()
+        # Ranges older than the gap filling window are never asked again
+        oldest = date_to_int(datetime.today() - timedelta(days = gcnv.GAP_FILL_BACK_DAYS))
+        with self.journal.locked():
+            series = {} # (document, ticker) -> Series, None once deleted
+            empty_ranges = [] # operations kept in the journal
+            for operation in self.journal.read_locked():
+                if operation[0] == "empty_range":
+                    if operation[4] >= oldest:
+                        empty_ranges.append(operation)
+                elif operation[0] == "delete_ticker":
+                    for document in DOCUMENTS:
+                        series[(document, operation[1])] = None
+                    empty_ranges = [empty_range for empty_range in empty_ranges
+                                    if empty_range[2] != operation[1]]
+                else:
+                    for document, ticker in self.operation_series(operation, series):
+                        if series.get((document, ticker), False) is None:
+                            series[(document, ticker)] = Series() # stored again
+                        elif (document, ticker) not in series:
+                            series[(document, ticker)] = self.read_series(document, ticker)
+                        self.apply_operation(series[(document, ticker)], ticker, operation)
+            for document in DOCUMENTS:
+                self.storage.write_many(document, {ticker: changed
+                        for (changed_document, ticker), changed in series.items()
+                        if changed_document == document and changed is not None})
+            for (document, ticker), changed in series.items():
+                if changed is None:
+                    try:
+                        self.storage.delete(document, ticker)
+                    except FileNotFoundError:
+                        pass
+            self.journal.write_locked([self.journal.line(operation)
+                                        for operation in empty_ranges])
+        self.pending = defaultdict(list) # already in the data files
+        self.empty_ranges = defaultdict(list)
+        for _, document, ticker, first, last in empty_ranges:
+            self.empty_ranges[(document, ticker)].append((first, last))
+
+    # Exit without saving: forgets the operations of this session
+    def discard(self):
+        self.journal.discard_session()
 
     def store_history(self, document, ticker, date, value):
         assert document in DOCUMENTS
         data = getattr(self, document)
         if not ticker in data:
-            data[ticker] = {}
-        data[ticker][date] = value
-        self.modified.add((document, ticker))
+            data[ticker] = Series()
+        data[ticker].set(date, value)
+        self.index_dates(document, ticker, data[ticker])
+        self.touch(document, ticker)
+        self.journal.append(["store", document, ticker, date_to_int(date), value])
 
-    def get_max_stored_date(self, document, ticker):
+    # Stores many dates of a series at once, with one journal operation
+    def store_history_block(self, document, ticker, dates, values):
         assert document in DOCUMENTS
-        data = self.find_in_data(document, ticker, None, silent = True)
-        if data is None:
+        if len(dates) == 0:
+            return
+        data = getattr(self, document)
+        if not ticker in data:
+            data[ticker] = Series()
+        dates = [date_to_int(date) for date in dates]
+        values = list(values)
+        data[ticker].merge(dates, values)
+        self.index_dates(document, ticker, data[ticker])
+        self.touch(document, ticker)
+        self.journal.append(["store_block", document, ticker, dates, values])
+
+    # Records the trading days between first and last (dates) still missing
+    # after a request that should have brought them, so they aren't requested
+    # again. The last gcnv.EMPTY_SETTLE_DAYS can still come later
+    def store_empty_range(self, document, ticker, first, last):
+        assert document in DOCUMENTS
+        last = min(last, (datetime.today() - timedelta(days = gcnv.EMPTY_SETTLE_DAYS)).date())
+        if last < first:
+            return
+        dates = (self.get_window(document, ticker, last, (last - first).days + 1)[0]
+                    if ticker in getattr(self, document) else [])
+        for missing in fetch_planner.missing_ranges(dates, first, last,
+                                    self.get_empty_dates(document, ticker)):
+            missing = [date_to_int(day) for day in missing]
+            self.empty_ranges[(document, ticker)].append(tuple(missing))
+            self.journal.append(["empty_range", document, ticker, *missing])
+
+    # Trading days (YYYYMMDD) requested that came back empty
+    def get_empty_dates(self, document, ticker):
+        return {date_to_int(day) for first, last in self.empty_ranges.get((document, ticker), [])
+                    for day in trading_calendar.trading_days(int_to_date(first), int_to_date(last))}
+
+    # Options snapshot as a dict (delta, price, timestamp, expiration_date,
+    # strike, right), None if not stored or older than ttl seconds
+    def get_option_quote(self, ticker, expiration_date, strike, right, ttl = None):
+        if ticker not in self.options:
             return None
-        else:
-            return datetime.strptime(max(data.keys()), "%Y%m%d")
+        return self.options[ticker].get(expiration_date, strike, right,
+                                        gcnv.OPTIONS_TTL if ttl is None else ttl)
+
+    def store_option_quote(self, ticker, expiration_date, strike, right, delta, price,
+                            timestamp = None):
+        if ticker not in self.options:
+            self.options[ticker] = OptionChain()
+        self.options[ticker].set(expiration_date, strike, right, delta, price,
+                                time.time() if timestamp is None else timestamp)
+        self.options_modified.add(ticker)
+
+    # Stores the values of many tickers on the same date ({ticker: value}),
+    # with one journal operation
+    def store_date(self, document, date, values):
+        assert document in DOCUMENTS
+        if len(values) == 0:
+            return
+        data = getattr(self, document)
+        date = date_to_int(date)
+        for ticker, value in values.items():
+            if not ticker in data:
+                data[ticker] = Series()
+            data[ticker].set(date, value)
+            self.index_dates(document, ticker, data[ticker])
+            self.touch(document, ticker)
+        self.journal.append(["store_date", document, date, values])
+
+    # Changes every time the series is modified
+    def version(self, document, ticker):
+        return self.versions.get((document, ticker), 0)
+
+    def get_max_stored_date(self, document, ticker):
+        return self.get_stored_dates(document, ticker)[1]
+
+    def get_min_stored_date(self, document, ticker):
+        return self.get_stored_dates(document, ticker)[0]
+
+    # (first, last) stored datetimes, kept up to date on every change
+    def get_stored_dates(self, document, ticker):
+        assert document in DOCUMENTS
+        try:
+            return self.date_index[(document, ticker)][2:]
+        except KeyError:
+            data = self.find_in_data(document, ticker, None, silent = True)
+            if data is None:
+                return (None, None)
+            self.index_dates(document, ticker, data)
+            return self.date_index[(document, ticker)][2:]
     
     def find_in_data(self, document, ticker, date, silent):
         assert document in DOCUMENTS
@@ -60,8 +243,7 @@ class DataHandler:
             if date is None:
                 return data[ticker]
             else:
-                date = util.date_in_string(date)
-                return data[ticker][date]
+                return data[ticker][date_to_int(date)]
         except KeyError as e:
             if silent:
                 return None
@@ -73,11 +255,18 @@ class DataHandler:
                     f"{ticker} info not available and remote not connected")
 
     def delete_at(self, date):
+        date = date_to_int(date)
         for document in DOCUMENTS:
             data = getattr(self, document)
-            for ticker, prices in data.items():
-                prices.pop(date, None)
-                self.modified.add((document, ticker))
+            with data.lock:
+                for ticker in data.keys():
+                    prices = data.loaded(ticker)
+                    if prices is None:
+                        self.pending[(document, ticker)].append(["delete_at", date])
+                    elif prices.pop(date) is not None:
+                        self.index_dates(document, ticker, prices)
+                        self.touch(document, ticker)
+        self.journal.append(["delete_at", date])
         if gcnv.ib:
             gcnv.ib.reset_session_requested_data()
 
@@ -91,44 +280,188 @@ class DataHandler:
         for document in DOCUMENTS:
             data = getattr(self, document)
             data.pop(ticker, None)
+            self.pending.pop((document, ticker), None)
+            self.date_index.pop((document, ticker), None)
+            self.empty_ranges.pop((document, ticker), None)
+            self.touch(document, ticker)
             try:
-                os.remove(f"{gcnv.APP_PATH}/data/{document}/{ticker}.json") # delete file
+                self.storage.delete(document, ticker) # delete file
             except FileNotFoundError as e:
-                gcnv.messages.append(f"Didn't find file: {gcnv.APP_PATH}/data/{document}/{ticker}.json")
+                gcnv.messages.append(f"Didn't find file: {self.storage.path(document, ticker)}")
+        self.journal.append(["delete_ticker", ticker])
         if gcnv.ib:
             gcnv.ib.reset_session_requested_data()
 
     # +++ Data +++
 
-    # Last list element is the most recent value, achieved by data.reverse() statement
-    def list_data(self, wtb, back_days):
+    # Last list element is the most recent value. Every series is sliced to the
+    # back_days window with two binary searches and aligned in one pass,
+    # by default keeping only the dates stored for all the tickers
+    def list_data(self, wtb, back_days, policy = alignment.INNER):
         assert all(document in DOCUMENTS for document, _ in wtb)
-        min_stored_date = min(
-            self.get_max_stored_date(document, ticker) for document, ticker in wtb)
-        missing_dates = []
-        data = []
-        for i in range(back_days):
-            older_date = min_stored_date - timedelta(days = i)
-            close = []
-            for document, ticker in wtb:
-                close.append(
-                    self.find_in_data(
-                            document,
-                            ticker,
-                            older_date.strftime("%Y%m%d"),
-                            True))
-            if all(close_i is not None for close_i in close):
-                data.append(close)
-            else:
-                if older_date.weekday() not in (5,6): # not a weekend and still not stored
-                    missing_dates.append(older_date.strftime("%Y%m%d"))
+        aligned = self.get_alignment(wtb, back_days, policy)
         if back_days < 365 * 2:
             cdl = round(back_days * (5 / 7)) # correct_data_length
-            if len(data) < cdl - 30 or len(data) > cdl + 15:
+            if len(aligned) < cdl - 30 or len(aligned) > cdl + 15:
                 gcnv.messages.append(
                     f"Incorrect data length for {wtb}. "
-                    f"Should return {cdl} but returning {len(data)}. "
-                    f"Missing dates: {missing_dates}")
-        data.reverse()
-        data = list(zip(*data))
-        return data
\ No newline at end of file
+                    f"Should return {cdl} but returning {len(aligned)}. "
+                    f"Missing dates: {[str(date) for date in aligned.missing_dates()]}")
+        if len(aligned) == 0:
+            return []
+        return [tuple(column) for column in aligned.columns]
+
+    # The alignment of the widest window asked for each wtb is kept while its
+    # series don't change, and the shorter ones (eg. several horizons of the
+    # same table) are taken from its last dates instead of aligning again
+    def get_alignment(self, wtb, back_days, policy = alignment.INNER):
+        min_stored_date = min(
+            self.get_max_stored_date(document, ticker) for document, ticker in wtb)
+        start = min_stored_date - timedelta(days = back_days - 1)
+        key = (tuple((document, ticker) for document, ticker in wtb), policy)
+        versions = tuple(self.version(document, ticker) for document, ticker in wtb)
+        widest = self.alignments.get(key)
+        if widest is not None and widest[0] == versions and widest[1] >= back_days:
+            self.alignments.move_to_end(key)
+            return widest[2].suffix(date_to_int(start))
+        windows = [self.get_window(document, ticker, min_stored_date, back_days)
+                    for document, ticker in wtb]
+        aligned = alignment.align(windows, policy, start, min_stored_date)
+        if policy in alignment.SUFFIX_POLICIES:
+            self.alignments[key] = (versions, back_days, aligned)
+            self.alignments.move_to_end(key)
+            if len(self.alignments) > ALIGNMENTS_SIZE:
+                self.alignments.popitem(last = False)
+        return aligned
+
+    # Statistics of the windows list_data returns, from the running sums of
+    # the series. None when they can't be calculated that way, to fall back
+    # to the values
+
+    def window_mean(self, document, ticker, back_days):
+        windows = self.get_series_windows([[document, ticker]], back_days)
+        if windows is None:
+            return None
+        series, i, j = windows[0]
+        return series.window_mean(i, j)
+
+    def window_changes_stdev(self, document, ticker, back_days, log = False):
+        windows = self.get_series_windows([[document, ticker]], back_days)
+        if windows is None:
+            return None
+        series, i, j = windows[0]
+        return series.window_changes_stdev(i, j, log)
+
+    # Only when every window has the same dates, so aligning them changes nothing
+    def parallel_changes_stdevs(self, wtb, back_days):
+        windows = self.get_series_windows(wtb, back_days)
+        if windows is None:
+            return None
+        first_series, first_i, first_j = windows[0]
+        dates = first_series.dates[first_i:first_j]
+        if any(series.dates[i:j] != dates for series, i, j in windows[1:]):
+            return None
+        stdevs = [series.window_changes_stdev(i, j) for series, i, j in windows]
+        return None if None in stdevs else stdevs
+
+    # (series, i, j) of each list_data window before aligning them,
+    # None if a series isn't stored
+    def get_series_windows(self, wtb, back_days):
+        assert all(document in DOCUMENTS for document, _ in wtb)
+        last_dates = [self.get_max_stored_date(document, ticker) for document, ticker in wtb]
+        if None in last_dates:
+            return None
+        end_date = min(last_dates)
+        start = date_to_int(end_date - timedelta(days = back_days - 1))
+        windows = []
+        for document, ticker in wtb:
+            series = getattr(self, document)[ticker]
+            windows.append((series, *series.window_bounds(start, date_to_int(end_date))))
+        return windows
+
+    # Dates and values of the back_days calendar days ending at end_date
+    def get_window(self, document, ticker, end_date, back_days):
+        assert document in DOCUMENTS
+        return getattr(self, document)[ticker].window(
+                    date_to_int(end_date - timedelta(days = back_days - 1)),
+                    date_to_int(end_date))
+
+    # Private
+
+    def load_series(self, document, ticker):
+        series = self.read_series(document, ticker)
+        for operation in self.pending.pop((document, ticker), []):
+            self.apply_operation(series, ticker, operation)
+        self.index_dates(document, ticker, series)
+        return series
+
+    def read_series(self, document, ticker):
+        try:
+            return self.storage.read(document, ticker)
+        except FileNotFoundError:
+            return Series() # only stored in the journal
+
+    def apply_operation(self, series, ticker, operation):
+        if operation[0] == "store":
+            series.set(operation[3], operation[4])
+        elif operation[0] == "store_block":
+            series.merge(operation[3], operation[4])
+        elif operation[0] == "store_date":
+            series.set(operation[2], operation[3][ticker])
+        elif operation[0] == "delete_at":
+            series.pop(operation[1])
+
+    # (document, ticker) of the series a journal store or delete_at operation
+    # changes, when compacting. series are the ones already read, None if deleted
+    def operation_series(self, operation, series):
+        if operation[0] in ("store", "store_block"):
+            return [(operation[1], operation[2])]
+        if operation[0] == "store_date":
+            return [(operation[1], ticker) for ticker in operation[3]]
+        if operation[0] == "delete_at":
+            keys = set()
+            for document in DOCUMENTS:
+                keys.update((document, ticker) for ticker in self.storage.tickers(document))
+            keys.update(series)
+            return [key for key in keys if series.get(key, False) is not None]
+        return []
+
+    # Invalidates the calculations cached for the series
+    def touch(self, document, ticker):
+        self.versions[(document, ticker)] += 1
+        if gcnv.analytics_cache is not None:
+            gcnv.analytics_cache.invalidate(document, ticker)
+
+    def index_dates(self, document, ticker, series):
+        first, last = series.first_date(), series.last_date()
+        indexed = self.date_index.get((document, ticker))
+        if indexed is not None and indexed[:2] == (first, last):
+            return
+        self.date_index[(document, ticker)] = (
+            first, last,
+            None if first is None else int_to_date(first),
+            None if last is None else int_to_date(last))
+
+    # Queues a journal operation read on startup for the series it affects
+    def index_operation(self, operation):
+        if operation[0] in ("store", "store_block"):
+            _, document, ticker, _, _ = operation
+            getattr(self, document).index(ticker)
+            self.pending[(document, ticker)].append(operation)
+        elif operation[0] == "store_date":
+            _, document, _, values = operation
+            for ticker in values:
+                getattr(self, document).index(ticker)
+                self.pending[(document, ticker)].append(operation)
+        elif operation[0] == "delete_at":
+            for document in DOCUMENTS:
+                for ticker in getattr(self, document).keys():
+                    self.pending[(document, ticker)].append(operation)
+        elif operation[0] == "empty_range":
+            _, document, ticker, first, last = operation
+            self.empty_ranges[(document, ticker)].append((first, last))
+        elif operation[0] == "delete_ticker":
+            for document in DOCUMENTS:
+                getattr(self, document).pop(operation[1])
+                self.pending.pop((document, operation[1]), None)
+                self.empty_ranges.pop((document, operation[1]), None)
@@ -0,0 +1,61 @@
+from threading import Lock
+
+# Ticker -> Series mapping for one document (iv, hv, stock). When lazy, only
+# the ticker names are indexed on creation and each series is read with
+# loader(ticker) the first time it's accessed
+class Document:
+    def __init__(self, name, tickers, loader, lazy = True):
+        self.name = name
+        self.loader = loader
+        self.series = {}
+        self.unloaded = set(tickers)
+        self.lock = Lock()
+        if not lazy:
+            for ticker in tickers:
+                self.load(ticker)
+
+    def __contains__(self, ticker):
+        return ticker in self.series or ticker in self.unloaded
+
+    def __getitem__(self, ticker):
+        self.load(ticker)
+        return self.series[ticker]
+
+    def __setitem__(self, ticker, series):
+        self.unloaded.discard(ticker)
+        self.series[ticker] = series
+
+    def __len__(self):
+        return len(self.series) + len(self.unloaded)
+
+    def get(self, ticker, default = None):
+        self.load(ticker)
+        return self.series.get(ticker, default)
+
+    def pop(self, ticker, default = None):
+        self.unloaded.discard(ticker)
+        return self.series.pop(ticker, default)
+
+    def keys(self):
+        return list(self.series.keys()) + list(self.unloaded)
+
+    # Registers a ticker without loading it
+    def index(self, ticker):
+        if ticker not in self.series:
+            self.unloaded.add(ticker)
+
+    # Series if it's already loaded, None otherwise
+    def loaded(self, ticker):
+        return self.series.get(ticker)
+
+    # Forces the loading of every ticker of the document
+    def items(self):
+        return [(ticker, self[ticker]) for ticker in self.keys()]
+
+    def load(self, ticker):
+        if ticker not in self.unloaded:
+            return
+        with self.lock:
+            if ticker in self.unloaded: # could have been loaded while waiting
+                self.series[ticker] = self.loader(ticker)
+                self.unloaded.discard(ticker)
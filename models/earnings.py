@@ -0,0 +1,80 @@
+import json
+import os
+from json.decoder import JSONDecodeError
+from datetime import date, datetime, timedelta
+
+import gcnv
+
+# Earnings dates of data/earnings.json ({ticker: "MM/DD/YYYY..."}, written by
+# the 'earnings' command). The file is parsed once and read again only when
+# its modification time changes or after invalidate(). Columns shown for
+# each ticker are calculated once per day
+class EarningsCalendar:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+        self.texts = {}
+        self.dates = {} # ticker -> earnings date, None if it can't be parsed
+        self.columns = {} # ticker -> [text, days to earnings], for self.day
+        self.day = None
+
+    # [text, days to earnings]: text is the date without the current year,
+    # T (today) or Y (yesterday) followed by the time, or P (past)
+    def get(self, ticker):
+        self.refresh()
+        today = date.today()
+        if today != self.day:
+            self.columns = {}
+            self.day = today
+        if ticker not in self.columns:
+            self.columns[ticker] = self.classify(ticker, today)
+        return self.columns[ticker]
+
+    def invalidate(self):
+        self.mtime = None
+
+    # Private
+
+    def refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = 0
+        if mtime == self.mtime:
+            return
+        try:
+            with open(self.path, "r") as f:
+                texts = json.load(f)
+        except (JSONDecodeError, FileNotFoundError) as e:
+            texts = {}
+        self.mtime = mtime
+        self.texts = texts
+        self.dates = {}
+        for ticker, text in texts.items():
+            try:
+                self.dates[ticker] = datetime.strptime(text[:10], "%m/%d/%Y").date()
+            except ValueError:
+                self.dates[ticker] = None
+        self.columns = {}
+
+    def classify(self, ticker, today):
+        if ticker not in self.texts:
+            return ["-", "-"]
+        earnings_date = self.dates[ticker]
+        if earnings_date is None:
+            return ["PrsErr", "-"]
+        text = self.texts[ticker]
+        if earnings_date == today:
+            text = "T" + text[10:]
+        elif earnings_date == today - timedelta(days=1):
+            text = "Y" + text[10:]
+        elif earnings_date < today - timedelta(days=1):
+            text = "P"
+        else:
+            text = text.replace(f"/{today.year}", "")
+        return [text, (earnings_date - today).days]
+
+def get_calendar():
+    if gcnv.earnings_calendar is None:
+        gcnv.earnings_calendar = EarningsCalendar(f"{gcnv.APP_PATH}/data/earnings.json")
+    return gcnv.earnings_calendar
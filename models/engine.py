@@ -0,0 +1,139 @@
+import math
+import statistics
+from itertools import accumulate
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from lib import util
+import gcnv
+
+# Calculations shared by the models. Sequences are returned as lists and
+# numbers as floats whatever the engine, so models don't depend on it.
+# Select it with gcnv.ENGINE
+
+# Pure python implementation, reference for the other engines
+class PythonEngine:
+    def scaled(self, values, factor):
+        return [value * factor for value in values]
+
+    def percentage_changes(self, closes):
+        return [(closes[i] / closes[i-1] - 1) * 100 for i in range(1, len(closes))]
+
+    def log_changes(self, closes):
+        return [math.log(closes[i] / closes[i-1]) * 100 for i in range(1, len(closes))]
+
+    # Changes from the first close, starting with 0
+    def accumulative_percentage_changes(self, closes):
+        base = closes[0]
+        return [0] + [(closes[i] / base - 1) * 100 for i in range(1, len(closes))]
+
+    # Changes of a pair position, hedging the second leg with ratio
+    def pair_changes(self, changes1, changes2, ratio, positively_correlated):
+        if positively_correlated:
+            return [changes1[i] - changes2[i] * ratio for i in range(len(changes1))]
+        else:
+            return [changes1[i] + changes2[i] * ratio for i in range(len(changes1))]
+
+    def scaled_difference(self, values1, values2, factor):
+        return [values1[i] * factor - values2[i] * factor for i in range(len(values2))]
+
+    def cumulative_sum(self, values):
+        return list(accumulate(values))
+
+    def up_down(self, changes):
+        return [1 if change >= 0 else -1 for change in changes]
+
+    def positive_count(self, values):
+        return sum(1 for value in values if value > 0)
+
+    def mean(self, values):
+        return statistics.mean(values)
+
+    def stdev(self, values):
+        return statistics.stdev(values)
+
+    def covariance(self, values1, values2):
+        return util.covariance(values1, values2)
+
+    # Percentage of values lower or equal than value
+    def percentile_rank(self, value, values):
+        count = 0
+        for close in values:
+            if value >= close:
+                count += 1
+        return count / len(values) * 100
+
+# Array based implementation, needs numpy installed
+class NumpyEngine:
+    def scaled(self, values, factor):
+        return (numpy.asarray(values, dtype=float) * factor).tolist()
+
+    def percentage_changes(self, closes):
+        closes = numpy.asarray(closes, dtype=float)
+        return ((closes[1:] / closes[:-1] - 1) * 100).tolist()
+
+    def log_changes(self, closes):
+        closes = numpy.asarray(closes, dtype=float)
+        return (numpy.log(closes[1:] / closes[:-1]) * 100).tolist()
+
+    def accumulative_percentage_changes(self, closes):
+        closes = numpy.asarray(closes, dtype=float)
+        return [0] + ((closes[1:] / closes[0] - 1) * 100).tolist()
+
+    def pair_changes(self, changes1, changes2, ratio, positively_correlated):
+        changes1 = numpy.asarray(changes1, dtype=float)
+        changes2 = numpy.asarray(changes2, dtype=float)
+        if positively_correlated:
+            return (changes1 - changes2 * ratio).tolist()
+        else:
+            return (changes1 + changes2 * ratio).tolist()
+
+    def scaled_difference(self, values1, values2, factor):
+        values2 = numpy.asarray(values2, dtype=float)
+        values1 = numpy.asarray(values1[:len(values2)], dtype=float)
+        return (values1 * factor - values2 * factor).tolist()
+
+    def cumulative_sum(self, values):
+        return numpy.cumsum(numpy.asarray(values, dtype=float)).tolist()
+
+    def up_down(self, changes):
+        return numpy.where(numpy.asarray(changes) >= 0, 1, -1).tolist()
+
+    def positive_count(self, values):
+        return int(numpy.count_nonzero(numpy.asarray(values) > 0))
+
+    def mean(self, values):
+        if len(values) == 0:
+            raise statistics.StatisticsError("mean requires at least one data point")
+        return float(numpy.mean(values))
+
+    def stdev(self, values):
+        if len(values) < 2:
+            raise statistics.StatisticsError("stdev requires at least two data points")
+        return float(numpy.std(values, ddof=1))
+
+    def covariance(self, values1, values2):
+        if len(values1) != len(values2):
+            raise RuntimeError("Covariance lists should have the same lenghts")
+        return float(numpy.cov(values1, values2, ddof=1)[0][1])
+
+    def percentile_rank(self, value, values):
+        values = numpy.asarray(values, dtype=float)
+        return int(numpy.count_nonzero(values <= value)) / len(values) * 100
+
+ENGINES = {
+    'python': PythonEngine,
+    'numpy': NumpyEngine
+}
+
+engines = {}
+
+def get():
+    if gcnv.ENGINE not in engines:
+        if gcnv.ENGINE == 'numpy' and numpy is None:
+            raise RuntimeError("ENGINE is 'numpy' but numpy is not installed")
+        engines[gcnv.ENGINE] = ENGINES[gcnv.ENGINE]()
+    return engines[gcnv.ENGINE]
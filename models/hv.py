@@ -1,17 +1,25 @@
-import statistics
-from functools import lru_cache
-
+from models import engine
+from models.cache import cached
 import gcnv
 
 class HV:
     def __init__(self, ticker):
         self.ticker = ticker
 
-    @lru_cache(maxsize=None)
+    def cache_key(self):
+        return (self.ticker,)
+
+    def dependencies(self):
+        return (("hv", self.ticker),)
+
+    @cached
     def period_list(self, back_days):
         hvs = gcnv.data_handler.list_data([["hv", self.ticker]], back_days)[0]
-        return [hv * 100 for hv in hvs]
+        return engine.get().scaled(hvs, 100)
 
-    @lru_cache(maxsize=None)
+    @cached
     def period_average(self, back_days):
-        return statistics.mean(self.period_list(back_days))
\ No newline at end of file
+        mean = gcnv.data_handler.window_mean("hv", self.ticker, back_days)
+        if mean is not None:
+            return mean * 100
+        return engine.get().mean(self.period_list(back_days))
\ No newline at end of file
@@ -1,31 +1,43 @@
-import statistics
-from functools import lru_cache
+from datetime import timedelta
 
+import pygal
+
+from lib.errors import *
+from models import engine
+from models.cache import cached
+from models.rolling import rolling_ranks
+from models.series import int_to_date
 import gcnv
 
 class IV:
     def __init__(self, ticker):
         self.ticker = ticker
 
-    @lru_cache(maxsize=None)
+    def cache_key(self):
+        return (self.ticker,)
+
+    def dependencies(self):
+        return (("iv", self.ticker),)
+
+    @cached
     def period_list(self, back_days):
         ivs = gcnv.data_handler.list_data([["iv", self.ticker]], back_days)[0]
-        ivs = [iv * 100 for iv in ivs]
+        ivs = engine.get().scaled(ivs, 100)
         ivs.reverse() # Reverse so first element of the array will be the last iv
         return ivs
     
-    @lru_cache(maxsize=None)
+    @cached
     def min(self, back_days):
         return min(self.period_list(back_days))
     
-    @lru_cache(maxsize=None)
+    @cached
     def max(self, back_days):
         return max(self.period_list(back_days))
 
     def get_at(self, date):
         return gcnv.data_handler.find_in_data("iv", self.ticker, date, False) * 100
 
-    @lru_cache(maxsize=None)
+    @cached
     def period_iv_ranks(self, back_days, max_results):
         period_iv_ranks = []
         for iv in self.period_list(back_days):
@@ -34,9 +46,12 @@ class IV:
                 break
         return period_iv_ranks
 
-    @lru_cache(maxsize=None)
+    @cached
     def period_average(self, back_days):
-        return statistics.mean(self.period_list(back_days))
+        mean = gcnv.data_handler.window_mean("iv", self.ticker, back_days)
+        if mean is not None:
+            return mean * 100
+        return engine.get().mean(self.period_list(back_days))
 
     def current_to_average_ratio(self, date, back_days):
         return self.get_at(date) / self.period_average(back_days)
@@ -50,7 +65,7 @@ class IV:
                 self.period_list(back_days)[0], back_days)
 
     # weighted (or not) average between min-max rank and percentile rank
-    @lru_cache(maxsize=None)
+    @cached
     def current_weighted_iv_rank(self, back_days):
         return round(
                 (2 * self.current_mm_iv_rank(back_days)
@@ -58,15 +73,38 @@ class IV:
                 ) / 3.0
             )
 
+    # [(date, min-max rank, percentile rank)] of each date against its own
+    # back_days window, oldest first. The last history_days, or every date
+    # with a whole window stored. Ranks aren't rounded
+    @cached
+    def rank_history(self, back_days, history_days = None):
+        first, last = gcnv.data_handler.get_stored_dates("iv", self.ticker)
+        if last is None:
+            raise GettingInfoError(f"No IV data for {self.ticker}")
+        start = first + timedelta(days = back_days - 1) # first whole window
+        days = (last - first).days + 1
+        if history_days is not None:
+            start = max(start, last - timedelta(days = history_days - 1))
+            days = min(days, history_days + back_days - 1)
+        dates, ivs = gcnv.data_handler.get_window("iv", self.ticker, last, days)
+        return rolling_ranks(dates, engine.get().scaled(ivs, 100), back_days, start)
+
+    def output_rank_chart(self, back_days, history_days = None):
+        history = self.rank_history(back_days, history_days)
+        line_chart = pygal.Line(truncate_label=-1, show_dots=False)
+        line_chart.title = f"{self.ticker} IV rank"
+        line_chart.x_title = f"Back days: {back_days}"
+        line_chart.x_labels = [str(int_to_date(date).date()) if i % 20 == 0 else ''
+                                for i, (date, _, _) in enumerate(history)]
+        line_chart.add("Min-max", [mm_rank for _, mm_rank, _ in history])
+        line_chart.add("Percentile", [percentile_rank for _, _, percentile_rank in history])
+        line_chart.render_to_file(f"{gcnv.store_dir}/{self.ticker}-ivr.svg")
+
     # Private
     
     # IV rank based on percentiles
     def calculate_percentile_iv_rank(self, iv, back_days):
-        count = 0
-        for close in self.period_list(back_days):
-            if iv >= close:
-                count += 1
-        return round(count / len(self.period_list(back_days)) * 100)
+        return round(engine.get().percentile_rank(iv, self.period_list(back_days)))
 
     # IV rank based on min-max levels
     def calculate_mm_iv_rank(self, iv, back_days):
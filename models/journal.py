@@ -0,0 +1,91 @@
+import fcntl
+import json
+import os
+from collections import Counter
+from contextlib import contextmanager
+
+# Append only log of data operations, one JSON list per line.
+# Operations are appended as they happen and replayed on startup until the
+# log is compacted into the data files.
+# The log is shared by every process using the data tree: operations are
+# kept in memory until flush() and every write holds an exclusive lock on
+# the file, so processes never interleave lines nor truncate operations
+# they haven't read
+class Journal:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "a")
+        self.buffer = [] # lines appended and not flushed yet
+        self.session = [] # lines flushed by this process, see discard_session
+
+    def read(self):
+        with self.locked(fcntl.LOCK_SH):
+            return self.read_locked()
+
+    def append(self, operation):
+        self.buffer.append(self.line(operation))
+
+    def flush(self):
+        if len(self.buffer) == 0:
+            return
+        with self.locked():
+            self.file.write("".join(self.buffer))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.session += self.buffer
+        self.buffer = []
+
+    # Bytes of the file, with the operations of every process
+    def size(self):
+        return os.fstat(self.file.fileno()).st_size
+
+    # Drops the operations logged by this process. Operations another process
+    # already compacted into the data files are kept
+    def discard_session(self):
+        self.buffer = []
+        with self.locked():
+            discarded = Counter(self.session)
+            lines = []
+            for line in self.read_lines():
+                if discarded[line] > 0:
+                    discarded[line] -= 1
+                else:
+                    lines.append(line)
+            self.write_locked(lines)
+
+    # Exclusive by default. Operations must be read and written again with
+    # read_locked and write_locked while it's held
+    @contextmanager
+    def locked(self, mode = fcntl.LOCK_EX):
+        fcntl.flock(self.file.fileno(), mode)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+
+    def read_locked(self):
+        operations = []
+        for line in self.read_lines():
+            try:
+                operations.append(json.loads(line))
+            except json.JSONDecodeError:
+                break # last line partially written when the process died
+        return operations
+
+    # Replaces the whole log, eg. with what is left after compacting it.
+    # What this process flushed is no longer its own to discard
+    def write_locked(self, lines):
+        self.file.truncate(0)
+        self.file.write("".join(lines))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.session = []
+
+    def line(self, operation):
+        return json.dumps(operation) + "\n"
+
+    # Private
+
+    def read_lines(self):
+        with open(self.path, "r") as f:
+            return f.readlines()
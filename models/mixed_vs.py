@@ -1,6 +1,5 @@
-from functools import lru_cache
-import statistics
-
+from models import engine
+from models.cache import cached
 import gcnv
 
 class MixedVs:
@@ -10,24 +9,29 @@ class MixedVs:
         self.ticker = self.iv.ticker
         assert self.iv.ticker == self.hv.ticker
 
+    def cache_key(self):
+        return (self.ticker,)
+
+    def dependencies(self):
+        return (("iv", self.ticker), ("hv", self.ticker))
+
     def iv_current_to_hv_average(self, date, back_days):
         return self.iv.get_at(date) / self.hv.period_average(back_days)
 
     def iv_average_to_hv_average(self, back_days):
         return self.iv.period_average(back_days) / self.hv.period_average(back_days)
 
-    @lru_cache(maxsize=None)
+    @cached
     def iv_hv_difference(self, back_days):
         ivs, hvs = gcnv.data_handler.list_data(
                     [["iv", self.ticker], ["hv", self.ticker]], back_days)
         hvs = hvs[20:] # 20 because no trading days are already removed
-        return [ivs[i] * 100 - hvs[i] * 100 for i in range(len(hvs))]
+        return engine.get().scaled_difference(ivs, hvs, 100)
 
     # returns percentage of success of daily one month volatility trading
     def positive_difference_ratio(self, back_days):
-        positive_count = sum(1 for diff in self.iv_hv_difference(back_days)
-                                if diff > 0)
+        positive_count = engine.get().positive_count(self.iv_hv_difference(back_days))
         return (positive_count / len(self.iv_hv_difference(back_days))) * 100
 
     def difference_average(self, back_days):
-        return statistics.mean(self.iv_hv_difference(back_days))
\ No newline at end of file
+        return engine.get().mean(self.iv_hv_difference(back_days))
\ No newline at end of file
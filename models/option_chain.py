@@ -0,0 +1,37 @@
+import json
+import time
+
+# Options snapshots of one ticker keyed by (expiration date, strike, right).
+# Contracts answered without a quote are stored with None delta and price,
+# so they aren't requested again while fresh
+class OptionChain:
+    def __init__(self):
+        self.snapshots = {}
+
+    @classmethod
+    def from_dict(cls, data):
+        chain = cls()
+        for key, snapshot in data.items():
+            expiration_date, strike, right = key.split(',')
+            chain.snapshots[(expiration_date, json.loads(strike), right)] = snapshot
+        return chain
+
+    def to_dict(self):
+        return {f"{expiration_date},{json.dumps(strike)},{right}": snapshot
+                for (expiration_date, strike, right), snapshot in self.snapshots.items()}
+
+    def __len__(self):
+        return len(self.snapshots)
+
+    # None if not stored or older than ttl seconds
+    def get(self, expiration_date, strike, right, ttl):
+        snapshot = self.snapshots.get((expiration_date, strike, right))
+        if snapshot is None or time.time() - snapshot['timestamp'] > ttl:
+            return None
+        return dict(snapshot, expiration_date=expiration_date, strike=strike, right=right)
+
+    def set(self, expiration_date, strike, right, delta, price, timestamp):
+        self.snapshots[(expiration_date, strike, right)] = {
+            'delta': delta,
+            'price': price,
+            'timestamp': timestamp}
@@ -1,12 +1,8 @@
-import statistics
-import math
-from functools import lru_cache
-from itertools import accumulate
-
 import pygal
 
-from lib import util
 from lib.errors import *
+from models import engine
+from models.cache import cached
 import gcnv
 
 class Pair:
@@ -15,38 +11,55 @@ class Pair:
         self.ticker2 = ticker2
         self.fixed_stdev_ratio = fixed_stdev_ratio
 
+    def cache_key(self):
+        return (self.ticker1, self.ticker2, self.fixed_stdev_ratio)
+
+    def dependencies(self):
+        return (("stock", self.ticker1), ("stock", self.ticker2))
+
     # -------- Correlation part -------
 
-    @lru_cache(maxsize=None)
+    @cached
     def correlation(self, back_days):
         changes1, changes2 = self.parallel_percentage_changes(back_days)
-        return (util.covariance(changes1, changes2)
-                / (statistics.stdev(changes1) * statistics.stdev(changes2)))
+        stdev1, stdev2 = self.changes_stdevs(back_days)
+        return engine.get().covariance(changes1, changes2) / (stdev1 * stdev2)
 
-    @lru_cache(maxsize=None)
+    @cached
     def beta(self, back_days):
         return self.correlation(back_days) * self.stdev_ratio(back_days)
 
-    @lru_cache(maxsize=None)
+    @cached
     def stdev_ratio(self, back_days):
         if self.fixed_stdev_ratio != None:
             return self.fixed_stdev_ratio
-        changes1, changes2 = self.parallel_percentage_changes(back_days)
-        return (statistics.stdev(changes1) / statistics.stdev(changes2))
+        stdev1, stdev2 = self.changes_stdevs(back_days)
+        return stdev1 / stdev2
 
     # Gets the daily standard deviation of backdays and multiplies by sqrt of 
     # year days to get the aggregated value
     def hv(self, back_days):
         changes_metric = self.percentage_changes(back_days) # simple percentage change
-        return statistics.stdev(changes_metric) * 15.8745 # = math.sqrt(252)
+        return engine.get().stdev(changes_metric) * 15.8745 # = math.sqrt(252)
 
-    @lru_cache(maxsize=None)
+    @cached
     def hv_to_10_ratio(self, back_days):
         return self.hv(back_days) / 10
 
+    # Stdevs of the parallel percentage changes, from the running sums of
+    # the series when both have the same dates
+    @cached
+    def changes_stdevs(self, back_days):
+        stdevs = gcnv.data_handler.parallel_changes_stdevs(
+                    [["stock", self.ticker1], ["stock", self.ticker2]], back_days)
+        if stdevs is not None:
+            return tuple(stdevs)
+        changes1, changes2 = self.parallel_percentage_changes(back_days)
+        return engine.get().stdev(changes1), engine.get().stdev(changes2)
+
     # -------- Pairs part ----------
 
-    @lru_cache(maxsize=None)
+    @cached
     def parallel_closes(self, back_days):
         closes = gcnv.data_handler.list_data(
                     [["stock", self.ticker1], ["stock", self.ticker2]],
@@ -56,77 +69,52 @@ class Pair:
                     f"No pairs data for {self.ticker1}-{self.ticker2}")
         return closes
 
-    @lru_cache(maxsize=None)
+    @cached
     def parallel_percentage_changes(self, back_days):
         closes_ticker1, closes_ticker2 = self.parallel_closes(back_days)
-
-        percentage_changes_ticker1 = []; percentage_changes_ticker2 = []
-        for i in range(1, len(closes_ticker1)):
-            percentage_changes_ticker1.append(
-                    (closes_ticker1[i] / closes_ticker1[i-1] - 1) * 100)
-            percentage_changes_ticker2.append(
-                    (closes_ticker2[i] / closes_ticker2[i-1] - 1) * 100)
-
-        return (percentage_changes_ticker1, percentage_changes_ticker2)
+        return (engine.get().percentage_changes(closes_ticker1),
+                engine.get().percentage_changes(closes_ticker2))
 
     # Calculates percentage changes taking the base from first day since back days.
     # Used mostly for charting
-    @lru_cache(maxsize=None)
+    @cached
     def parallel_accumulative_percentage_changes(self, back_days):
         closes_ticker1, closes_ticker2 = self.parallel_closes(back_days)
-
-        closes_ticker1_base = closes_ticker1[0]
-        closes_ticker2_base = closes_ticker2[0]
-
-        percentage_changes_ticker1 = [0] # starts with 0 change
-        percentage_changes_ticker2 = [0] # starts with 0 change
-        for i in range(1, len(closes_ticker1)):
-            percentage_changes_ticker1.append(
-                    (closes_ticker1[i] / closes_ticker1_base - 1) * 100)
-            percentage_changes_ticker2.append(
-                    (closes_ticker2[i] / closes_ticker2_base - 1) * 100)
-
-        return (percentage_changes_ticker1, percentage_changes_ticker2)
+        return (engine.get().accumulative_percentage_changes(closes_ticker1),
+                engine.get().accumulative_percentage_changes(closes_ticker2))
 
     # Percentage changes of the pair as a whole
-    @lru_cache(maxsize=None)
+    @cached
     def percentage_changes(self, back_days):
         percentage_changes1, percentage_changes2 = self.parallel_percentage_changes(back_days)
-        percentage_changes = []
-        positively_correlated = self.correlation(back_days) >= 0
-        for i in range(len(percentage_changes1)):
-            if positively_correlated:
-                change = percentage_changes1[i] - percentage_changes2[i] * self.stdev_ratio(back_days)
-            else:
-                change = percentage_changes1[i] + percentage_changes2[i] * self.stdev_ratio(back_days)
-            percentage_changes.append(change)
-        return percentage_changes
+        return engine.get().pair_changes(percentage_changes1, percentage_changes2,
+                    self.stdev_ratio(back_days), self.correlation(back_days) >= 0)
 
     # Could also be called accumulative_percentage_changes
     # Sum of percentage changes of the pair as a whole
-    @lru_cache(maxsize=None)
+    @cached
     def closes(self, back_days):
-        return list(accumulate(self.percentage_changes(back_days)))
+        return engine.get().cumulative_sum(self.percentage_changes(back_days))
 
     def get_last_close(self, back_days):
         return self.closes(back_days)[-1]
 
-    @lru_cache(maxsize=None)
+    @cached
     def ma(self, back_days):
         closes = self.closes(back_days)
         if len(closes) == 0:
             return None
-        return statistics.mean(closes)
+        return engine.get().mean(closes)
 
-    @lru_cache(maxsize=None)
+    @cached
     def current_to_ma_diff(self, back_days):
         return self.get_last_close(back_days) - self.ma(back_days)
 
-    @lru_cache(maxsize=None)
+    @cached
     def min(self, back_days):
         return min(self.closes(back_days))
 
-    @lru_cache(maxsize=None)
+    @cached
     def max(self, back_days):
         return max(self.closes(back_days))
 
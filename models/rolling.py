@@ -0,0 +1,84 @@
+from bisect import bisect_left
+from collections import deque
+
+from models.series import int_to_date
+
+# Ranks of every value of a series against the values of the back_days
+# calendar days ending at its date (the window list_data returns), for all
+# the dates at once. The min and max of the sliding window come from
+# monotonic deques and the percentile from a Fenwick tree that counts the
+# values in the window by their order, so a history of n values takes
+# O(n log n) instead of calculating each window again
+
+# Counts by position, with prefix totals in O(log n)
+class FenwickTree:
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def add(self, position, delta):
+        position += 1
+        while position < len(self.tree):
+            self.tree[position] += delta
+            position += position & -position
+
+    # Total of the positions [0, position]
+    def prefix(self, position):
+        position += 1
+        total = 0
+        while position > 0:
+            total += self.tree[position]
+            position -= position & -position
+        return total
+
+# Min (or max) of a sliding window: values that can't be the extreme of any
+# later window are dropped as soon as a new one arrives
+class MonotonicDeque:
+    def __init__(self, maximum = False):
+        self.sign = -1 if maximum else 1
+        self.items = deque() # (position, value), the extreme first
+
+    def push(self, position, value):
+        while len(self.items) > 0 and self.sign * self.items[-1][1] >= self.sign * value:
+            self.items.pop()
+        self.items.append((position, value))
+
+    # Drops the positions before first_position
+    def expire(self, first_position):
+        while len(self.items) > 0 and self.items[0][0] < first_position:
+            self.items.popleft()
+
+    def get(self):
+        return self.items[0][1]
+
+# [(date, min-max rank, percentile rank)] of the dates from start (a
+# datetime), by default the first with a whole window of dates. The
+# percentile is the percentage of values lower or equal than the value,
+# and the min-max rank is None when every value is the same
+def rolling_ranks(dates, values, back_days, start = None):
+    order = sorted(set(values))
+    positions = [bisect_left(order, value) for value in values]
+    days = [int_to_date(date).toordinal() for date in dates]
+    if len(days) == 0:
+        return []
+    first_day = days[0] + back_days - 1 if start is None else start.toordinal()
+    counts = FenwickTree(len(order))
+    minimum = MonotonicDeque()
+    maximum = MonotonicDeque(maximum = True)
+    ranks = []
+    first = 0 # position where the window starts
+    for i, value in enumerate(values):
+        counts.add(positions[i], 1)
+        minimum.push(i, value)
+        maximum.push(i, value)
+        while days[first] <= days[i] - back_days:
+            counts.add(positions[first], -1)
+            first += 1
+        minimum.expire(first)
+        maximum.expire(first)
+        if days[i] < first_day:
+            continue
+        low, high = minimum.get(), maximum.get()
+        ranks.append((dates[i],
+            None if high == low else (value - low) / (high - low) * 100,
+            counts.prefix(positions[i]) / (i - first + 1) * 100))
+    return ranks
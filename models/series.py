@@ -0,0 +1,205 @@
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date as Date, datetime
+
+# Dates are kept as YYYYMMDD integers: they sort chronologically and can be
+# binary searched without any string formatting or parsing
+def date_to_int(date):
+    if type(date) is int:
+        return date
+    elif type(date) is str:
+        return int(date)
+    elif isinstance(date, Date): # datetime or date
+        return date.year * 10000 + date.month * 100 + date.day
+    else:
+        raise RuntimeError(f"Wrong date type: {type(date)}")
+
+def int_to_date(date):
+    return datetime(date // 10000, date // 100 % 100, date % 100)
+
+# Running sums of a series values, and of their percentage and log changes
+# (x100) and squared changes. Element k of each array is the sum of the
+# first k positions (the change of the first position is 0), so the total
+# of any window is the difference of two elements. Changes after a zero or
+# negative value are NaN
+class PrefixSums:
+    def __init__(self):
+        self.values = array('d', [0.0])
+        self.changes = array('d', [0.0])
+        self.squared_changes = array('d', [0.0])
+        self.log_changes = array('d', [0.0])
+        self.squared_log_changes = array('d', [0.0])
+        self.last = None
+
+    def extend(self, values):
+        for value in values:
+            change = log_change = 0.0
+            if self.last is not None:
+                try:
+                    change = (value / self.last - 1) * 100
+                    log_change = math.log(value / self.last) * 100
+                except (ZeroDivisionError, ValueError):
+                    change = log_change = math.nan
+            self.values.append(self.values[-1] + value)
+            self.changes.append(self.changes[-1] + change)
+            self.squared_changes.append(self.squared_changes[-1] + change * change)
+            self.log_changes.append(self.log_changes[-1] + log_change)
+            self.squared_log_changes.append(self.squared_log_changes[-1] + log_change * log_change)
+            self.last = value
+
+# Columnar time series: a sorted int32 date array plus a float64 value array
+class Series:
+    def __init__(self, dates=(), values=()):
+        self.dates = array('i', dates)
+        self.values = array('d', values)
+        self.sums = None # PrefixSums, calculated when first needed
+
+    @classmethod
+    def from_dict(cls, data):
+        items = sorted((int(date), value) for date, value in data.items())
+        return cls((date for date, _ in items), (value for _, value in items))
+
+    # Read only series over existing buffers (eg. memory mapped files).
+    # They are copied to arrays the first time they are modified
+    @classmethod
+    def from_buffers(cls, dates, values):
+        series = cls()
+        series.dates = dates
+        series.values = values
+        return series
+
+    def to_dict(self):
+        return {str(date): value for date, value in zip(self.dates, self.values)}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, date):
+        return self.index_of(date) is not None
+
+    def __getitem__(self, date):
+        i = self.index_of(date)
+        if i is None:
+            raise KeyError(date)
+        return self.values[i]
+
+    def get(self, date, default=None):
+        i = self.index_of(date)
+        return default if i is None else self.values[i]
+
+    def set(self, date, value):
+        self.make_writable()
+        date = date_to_int(date)
+        i = bisect_left(self.dates, date)
+        if i < len(self.dates) and self.dates[i] == date:
+            self.values[i] = value
+            self.sums = None
+        elif i == len(self.dates):
+            self.dates.append(date)
+            self.values.append(value)
+            if self.sums is not None:
+                self.sums.extend((value,))
+        else:
+            self.dates.insert(i, date)
+            self.values.insert(i, value)
+            self.sums = None
+
+    # Stores many values at once, replacing the ones stored on the same
+    # dates. Only the stored dates from the oldest new one are rearranged
+    def merge(self, dates, values):
+        incoming = dict(zip((date_to_int(date) for date in dates), values))
+        if len(incoming) == 0:
+            return
+        self.make_writable()
+        new_dates = sorted(incoming)
+        i = bisect_left(self.dates, new_dates[0])
+        if i < len(self.dates):
+            self.sums = None
+            tail = dict(zip(self.dates[i:], self.values[i:]))
+            tail.update(incoming)
+            incoming = tail
+            new_dates = sorted(incoming)
+            del self.dates[i:]
+            del self.values[i:]
+        self.dates.extend(new_dates)
+        self.values.extend(incoming[date] for date in new_dates)
+        if self.sums is not None:
+            self.sums.extend(incoming[date] for date in new_dates)
+
+    # Returns the removed value or None if the date wasn't stored
+    def pop(self, date):
+        i = self.index_of(date)
+        if i is None:
+            return None
+        self.make_writable()
+        value = self.values[i]
+        del self.dates[i]
+        del self.values[i]
+        self.sums = None
+        return value
+
+    def first_date(self):
+        return self.dates[0] if len(self.dates) > 0 else None
+
+    def last_date(self):
+        return self.dates[-1] if len(self.dates) > 0 else None
+
+    # Dates and values between start and end (both included)
+    def window(self, start, end):
+        i, j = self.window_bounds(start, end)
+        return self.dates[i:j], self.values[i:j]
+
+    def window_bounds(self, start, end):
+        i = bisect_left(self.dates, date_to_int(start))
+        j = bisect_right(self.dates, date_to_int(end))
+        return i, max(i, j)
+
+    # Mean of the values in positions [i, j), None if empty
+    def window_mean(self, i, j):
+        if j <= i:
+            return None
+        sums = self.prefix_sums()
+        return (sums.values[j] - sums.values[i]) / (j - i)
+
+    # Sample stdev of the changes between the values in positions [i, j),
+    # None if there are less than 2 changes or they can't be calculated
+    def window_changes_stdev(self, i, j, log = False):
+        count = j - i - 1
+        if count < 2:
+            return None
+        sums = self.prefix_sums()
+        changes, squared_changes = ((sums.log_changes, sums.squared_log_changes) if log
+                                    else (sums.changes, sums.squared_changes))
+        total = changes[j] - changes[i + 1]
+        squared_total = squared_changes[j] - squared_changes[i + 1]
+        variance = (squared_total - total * total / count) / (count - 1)
+        if math.isnan(variance):
+            return None
+        return math.sqrt(max(variance, 0.0))
+
+    def keys(self):
+        return [str(date) for date in self.dates]
+
+    def items(self):
+        return [(str(date), value) for date, value in zip(self.dates, self.values)]
+
+    # Private
+
+    def prefix_sums(self):
+        if self.sums is None:
+            self.sums = PrefixSums()
+            self.sums.extend(self.values)
+        return self.sums
+
+    def make_writable(self):
+        if not isinstance(self.dates, array):
+            self.dates = array('i', self.dates)
+            self.values = array('d', self.values)
+
+    def index_of(self, date):
+        date = date_to_int(date)
+        i = bisect_left(self.dates, date)
+        if i < len(self.dates) and self.dates[i] == date:
+            return i
+        return None
@@ -1,18 +1,25 @@
-from functools import lru_cache
-import statistics
-import math
-
+from models import engine
+from models.cache import cached
 import gcnv
 
 class Stock:
     def __init__(self, ticker):
         self.ticker = ticker
 
-    @lru_cache(maxsize=None)
+    def cache_key(self):
+        return (self.ticker,)
+
+    def dependencies(self):
+        return (("stock", self.ticker),)
+
+    @cached
     def ma(self, back_days):
+        mean = gcnv.data_handler.window_mean("stock", self.ticker, back_days)
+        if mean is not None:
+            return mean
         if len(self.closes(back_days)) == 0:
             return None
-        return statistics.mean(self.closes(back_days))
+        return engine.get().mean(self.closes(back_days))
 
     def current_to_ma_percentage(self, date, back_days):
         return (float(self.get_close_at(date)) / self.ma(back_days) - 1.0) * 100
@@ -53,24 +60,21 @@ class Stock:
                 consecutive = 0
         return max_consecutive
 
-    @lru_cache(maxsize=None)
+    @cached
     def up_down_closes(self, back_days):
-        result = []
-        for change in self.percentage_changes(back_days):
-            if change >= 0:
-                result.append(1)
-            else:
-                result.append(-1)
-        return result
+        return engine.get().up_down(self.percentage_changes(back_days))
 
     # Gets the daily standard deviation of backdays and multiplies by sqrt of 
     # year days to get the aggregated value
     def hv(self, back_days):
+        stdev = gcnv.data_handler.window_changes_stdev("stock", self.ticker, back_days, log = True)
+        if stdev is not None:
+            return stdev * 15.8745
         # changes_metric = self.percentage_changes(back_days) # simple percentage change
         changes_metric = self.log_changes(back_days) # log changes
-        return statistics.stdev(changes_metric) * 15.8745 # = math.sqrt(252)
+        return engine.get().stdev(changes_metric) * 15.8745 # = math.sqrt(252)
 
-    @lru_cache(maxsize=None)
+    @cached
     def hv_to_10_ratio(self, back_days):
         return self.hv(back_days) / 10
 
@@ -83,16 +87,14 @@ class Stock:
 
     # Private
 
-    @lru_cache(maxsize=None)
+    @cached
     def closes(self, back_days):
         return gcnv.data_handler.list_data([["stock", self.ticker]], back_days)[0]
 
-    @lru_cache(maxsize=None)
+    @cached
     def percentage_changes(self, back_days):
-        closes = self.closes(back_days)
-        return [(closes[i] / closes[i-1] - 1) * 100 for i in range(1, len(closes))]
+        return engine.get().percentage_changes(self.closes(back_days))
 
-    @lru_cache(maxsize=None)
+    @cached
     def log_changes(self, back_days):
-        closes = self.closes(back_days)
-        return [math.log(closes[i] / closes[i-1]) * 100 for i in range(1, len(closes))]
\ No newline at end of file
+        return engine.get().log_changes(self.closes(back_days))
\ No newline at end of file
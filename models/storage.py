@@ -0,0 +1,204 @@
+import json
+import mmap
+import os
+import struct
+from abc import ABC, abstractmethod
+from array import array
+
+from models.series import Series
+from models.option_chain import OptionChain
+
+import gcnv
+
+# Where and how the series of each (document, ticker) are persisted.
+# Files live in data/<document>/<ticker><extension> unless a subclass
+# changes the path. Subclasses set the extension and implement read and write
+class Storage(ABC):
+    extension = None
+
+    def tickers(self, document):
+        return [filename[:-len(self.extension)]
+                for filename in os.listdir(f"{gcnv.APP_PATH}/data/{document}")
+                if filename.endswith(self.extension)]
+
+    def path(self, document, ticker):
+        return f"{gcnv.APP_PATH}/data/{document}/{ticker}{self.extension}"
+
+    def delete(self, document, ticker):
+        os.remove(self.path(document, ticker))
+
+    @abstractmethod
+    def read(self, document, ticker):
+        pass
+
+    @abstractmethod
+    def write(self, document, ticker, series):
+        pass
+
+    # {ticker: series} of the same document
+    def write_many(self, document, series):
+        for ticker, ticker_series in series.items():
+            self.write(document, ticker, ticker_series)
+
+# { "YYYYMMDD": close } JSON files
+class JsonStorage(Storage):
+    extension = '.json'
+
+    def read(self, document, ticker):
+        with open(self.path(document, ticker), "r") as f:
+            return Series.from_dict(json.load(f))
+
+    def write(self, document, ticker, series):
+        with open(self.path(document, ticker), "w") as f:
+            json.dump(series.to_dict(), f)
+
+# All the series of a document packed in one file, data/<document>.bin,
+# in the machine byte order:
+#   magic (4 bytes) + series count (uint32)
+#   per series: ticker length (uint16) + utf-8 ticker + count (uint32)
+#               + offset of its dates (uint64)
+#   per series, from an 8 bytes aligned offset: count int32 dates
+#   (YYYYMMDD), padded to 8 bytes, and count float64 values
+# Each file is memory mapped read only once, so a session holds one mapping
+# (and file descriptor) per document whatever the number of series. Series
+# are used without parsing and several processes share the same pages.
+# A series is copied to memory the first time it's modified
+class BinaryStorage(Storage):
+    extension = '.bin'
+    MAGIC = b"GCP1"
+    HEADER = struct.Struct("4sI")
+    ENTRY = struct.Struct("IQ")
+
+    def __init__(self):
+        self.packs = {} # document -> (file id, {ticker: (count, offset)}, view)
+
+    def tickers(self, document):
+        return list(self.pack(document)[1])
+
+    def path(self, document, ticker = None):
+        return f"{gcnv.APP_PATH}/data/{document}{self.extension}"
+
+    def read(self, document, ticker):
+        _, index, view = self.pack(document)
+        if ticker not in index:
+            raise FileNotFoundError(f"{ticker} in {self.path(document)}")
+        count, offset = index[ticker]
+        values_offset = offset + aligned(4 * count)
+        return Series.from_buffers(
+                    view[offset:offset + 4 * count].cast('i'),
+                    view[values_offset:values_offset + 8 * count].cast('d'))
+
+    def write(self, document, ticker, series):
+        self.write_many(document, {ticker: series})
+
+    def write_many(self, document, series):
+        if len(series) > 0:
+            self.rewrite(document, series)
+
+    def delete(self, document, ticker):
+        if ticker not in self.pack(document)[1]:
+            raise FileNotFoundError(f"{ticker} in {self.path(document)}")
+        self.rewrite(document, {}, ticker)
+
+    # Private
+
+    # The whole file is written again, with the series not changed copied
+    # from the current one. Written to a temporary file and renamed, so
+    # processes that have the previous version mapped keep reading a
+    # consistent file
+    def rewrite(self, document, changed, deleted = None):
+        series = {ticker: self.read(document, ticker) for ticker in self.tickers(document)
+                    if ticker not in changed and ticker != deleted}
+        series.update(changed)
+        tickers = sorted(series)
+        entries = []
+        offset = aligned(self.HEADER.size + sum(2 + len(ticker.encode()) + self.ENTRY.size
+                                                for ticker in tickers))
+        for ticker in tickers:
+            count = len(series[ticker])
+            entries.append((ticker.encode(), count, offset))
+            offset += aligned(4 * count) + 8 * count
+        path = self.path(document)
+        with open(f"{path}.tmp", "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, len(tickers)))
+            for encoded, count, offset in entries:
+                f.write(struct.pack("H", len(encoded)) + encoded + self.ENTRY.pack(count, offset))
+            for ticker, (_, count, offset) in zip(tickers, entries):
+                f.write(b"\0" * (offset - f.tell()))
+                f.write(array('i', series[ticker].dates).tobytes())
+                f.write(b"\0" * (aligned(4 * count) - 4 * count))
+                f.write(array('d', series[ticker].values).tobytes())
+        os.replace(f"{path}.tmp", path)
+        self.packs.pop(document, None)
+
+    # Mapping and index of the document file, mapped again when another
+    # process (or a rewrite) replaces it
+    def pack(self, document):
+        path = self.path(document)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None, {}, None
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if document in self.packs and self.packs[document][0] == file_id:
+            return self.packs[document]
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, series_count = self.HEADER.unpack_from(buffer)
+        if magic != self.MAGIC:
+            raise RuntimeError(f"Wrong binary file: {path}")
+        index = {}
+        position = self.HEADER.size
+        for _ in range(series_count):
+            length, = struct.unpack_from("H", buffer, position)
+            ticker = bytes(buffer[position + 2:position + 2 + length]).decode()
+            position += 2 + length
+            index[ticker] = self.ENTRY.unpack_from(buffer, position)
+            position += self.ENTRY.size
+        self.packs[document] = (file_id, index, memoryview(buffer))
+        return self.packs[document]
+
+# Options snapshots of each ticker,
+# { "expiration,strike,right": {delta, price, timestamp} } JSON files
+class OptionsStorage(Storage):
+    extension = '.json'
+
+    def tickers(self, document):
+        if not os.path.isdir(f"{gcnv.APP_PATH}/data/{document}"):
+            return []
+        return super().tickers(document)
+
+    def read(self, document, ticker):
+        with open(self.path(document, ticker), "r") as f:
+            return OptionChain.from_dict(json.load(f))
+
+    def write(self, document, ticker, chain):
+        os.makedirs(f"{gcnv.APP_PATH}/data/{document}", exist_ok = True)
+        with open(self.path(document, ticker), "w") as f:
+            json.dump(chain.to_dict(), f)
+
+STORAGES = {
+    'json': JsonStorage,
+    'bin': BinaryStorage
+}
+
+def get_storage(data_format):
+    try:
+        return STORAGES[data_format]()
+    except KeyError:
+        raise RuntimeError(f"Unknown data format: {data_format}")
+
+# One shot copy of the whole data tree from one format to another
+# (eg. 'json' -> 'bin' to import, 'bin' -> 'json' to export)
+def convert(documents, source_format, target_format):
+    source = get_storage(source_format)
+    target = get_storage(target_format)
+    converted = 0
+    for document in documents:
+        series = {ticker: source.read(document, ticker) for ticker in source.tickers(document)}
+        target.write_many(document, series)
+        converted += len(series)
+    return converted
+
+def aligned(size):
+    return size + (-size % 8)
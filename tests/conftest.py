@@ -0,0 +1,18 @@
+import pytest
+
+from models.datahandler import DataHandler, DOCUMENTS
+import gcnv
+
+# An empty data tree in a temporary directory, as gcnv.APP_PATH
+@pytest.fixture
+def data_tree(tmp_path, monkeypatch):
+    for document in DOCUMENTS + ["options"]:
+        (tmp_path / "data" / document).mkdir(parents = True)
+    monkeypatch.setattr(gcnv, "APP_PATH", str(tmp_path))
+    monkeypatch.setattr(gcnv, "messages", [])
+    return tmp_path
+
+@pytest.fixture
+def data_handler(data_tree, monkeypatch):
+    monkeypatch.setattr(gcnv, "data_handler", DataHandler())
+    return gcnv.data_handler
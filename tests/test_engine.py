@@ -0,0 +1,90 @@
+import math
+import random
+import statistics
+from itertools import accumulate
+
+import pytest
+
+from lib import util
+from models import engine
+
+# Every engine method against the loops the models used before the engines
+
+random_generator = random.Random(7)
+CLOSES1 = [100 + random_generator.uniform(-20, 20) for _ in range(300)]
+CLOSES2 = [50 + random_generator.uniform(-10, 10) for _ in range(300)]
+CHANGES1 = [(CLOSES1[i] / CLOSES1[i-1] - 1) * 100 for i in range(1, len(CLOSES1))]
+CHANGES2 = [(CLOSES2[i] / CLOSES2[i-1] - 1) * 100 for i in range(1, len(CLOSES2))]
+
+def baseline_pair_changes(changes1, changes2, ratio, positively_correlated):
+    percentage_changes = []
+    for i in range(len(changes1)):
+        if positively_correlated:
+            change = changes1[i] - changes2[i] * ratio
+        else:
+            change = changes1[i] + changes2[i] * ratio
+        percentage_changes.append(change)
+    return percentage_changes
+
+def baseline_up_down(changes):
+    result = []
+    for change in changes:
+        if change >= 0:
+            result.append(1)
+        else:
+            result.append(-1)
+    return result
+
+def baseline_percentile_rank(value, values):
+    count = 0
+    for close in values:
+        if value >= close:
+            count += 1
+    return count / len(values) * 100
+
+CASES = [
+    ("scaled", (CLOSES1, 100), [value * 100 for value in CLOSES1]),
+    ("percentage_changes", (CLOSES1,), CHANGES1),
+    ("log_changes", (CLOSES1,),
+        [math.log(CLOSES1[i] / CLOSES1[i-1]) * 100 for i in range(1, len(CLOSES1))]),
+    ("accumulative_percentage_changes", (CLOSES1,),
+        [0] + [(CLOSES1[i] / CLOSES1[0] - 1) * 100 for i in range(1, len(CLOSES1))]),
+    ("pair_changes", (CHANGES1, CHANGES2, 1.7, True),
+        baseline_pair_changes(CHANGES1, CHANGES2, 1.7, True)),
+    ("pair_changes", (CHANGES1, CHANGES2, 1.7, False),
+        baseline_pair_changes(CHANGES1, CHANGES2, 1.7, False)),
+    ("scaled_difference", (CLOSES1, CLOSES2[20:], 100),
+        [CLOSES1[i] * 100 - CLOSES2[20:][i] * 100 for i in range(len(CLOSES2) - 20)]),
+    ("cumulative_sum", (CHANGES1,), list(accumulate(CHANGES1))),
+    ("up_down", (CHANGES1,), baseline_up_down(CHANGES1)),
+    ("positive_count", (CHANGES1,), sum(1 for change in CHANGES1 if change > 0)),
+    ("mean", (CLOSES1,), statistics.mean(CLOSES1)),
+    ("stdev", (CHANGES1,), statistics.stdev(CHANGES1)),
+    ("covariance", (CHANGES1, CHANGES2), util.covariance(CHANGES1, CHANGES2)),
+    ("percentile_rank", (CLOSES1[-1], CLOSES1), baseline_percentile_rank(CLOSES1[-1], CLOSES1)),
+    ("percentile_rank", (CLOSES1[0], CLOSES1), baseline_percentile_rank(CLOSES1[0], CLOSES1)),
+]
+
+@pytest.fixture(params = ["python", "numpy"])
+def calculation_engine(request):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    return engine.ENGINES[request.param]()
+
+@pytest.mark.parametrize("method, args, expected", CASES,
+                            ids = [case[0] for case in CASES])
+def test_engine_matches_baseline(calculation_engine, method, args, expected):
+    result = getattr(calculation_engine, method)(*args)
+    if isinstance(expected, list):
+        assert isinstance(result, list)
+        assert len(result) == len(expected)
+        for value, expected_value in zip(result, expected):
+            assert value == pytest.approx(expected_value, rel = 1e-9, abs = 1e-12)
+    else:
+        assert not isinstance(result, list)
+        assert result == pytest.approx(expected, rel = 1e-9, abs = 1e-12)
+
+@pytest.mark.parametrize("method", ["mean", "stdev"])
+def test_engine_raises_statistics_error_on_short_lists(calculation_engine, method):
+    with pytest.raises(statistics.StatisticsError):
+        getattr(calculation_engine, method)([1.0] if method == "stdev" else [])
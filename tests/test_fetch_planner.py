@@ -0,0 +1,44 @@
+from datetime import date
+
+from ib import fetch_planner
+from lib import trading_calendar
+
+TODAY = date(2024, 3, 15) # a Friday
+
+def store_trading_days(data_handler, first, last, holes = ()):
+    days = [day for day in trading_calendar.trading_days(first, last) if day not in holes]
+    data_handler.store_history_block("stock", "AAA", days, [100.0] * len(days))
+
+def planned(data_handler):
+    return [(request.duration_string, request.end_date_time, request.missing)
+            for request in fetch_planner.plan("stock", "AAA", TODAY)]
+
+def test_brings_the_whole_horizon_when_nothing_is_stored(data_handler):
+    assert planned(data_handler) == [("2 Y", '', None)]
+
+def test_nothing_when_up_to_date(data_handler):
+    store_trading_days(data_handler, date(2024, 1, 2), TODAY)
+    assert planned(data_handler) == []
+
+def test_brings_the_days_after_the_last_stored(data_handler):
+    store_trading_days(data_handler, date(2024, 1, 2), date(2024, 3, 12))
+    assert planned(data_handler) == [
+        ("3 D", '', (date(2024, 3, 13), date(2024, 3, 15)))]
+
+def test_brings_a_hole_ending_at_its_last_day(data_handler):
+    store_trading_days(data_handler, date(2024, 1, 2), TODAY,
+                        holes = [date(2024, 2, 5), date(2024, 2, 6), date(2024, 2, 7)])
+    assert planned(data_handler) == [
+        ("3 D", "20240207 23:59:59 US/Eastern", (date(2024, 2, 5), date(2024, 2, 7)))]
+
+def test_close_holes_are_brought_in_one_request(data_handler):
+    store_trading_days(data_handler, date(2024, 1, 2), TODAY,
+                        holes = [date(2024, 2, 5), date(2024, 2, 8)])
+    assert planned(data_handler) == [
+        ("4 D", "20240208 23:59:59 US/Eastern", (date(2024, 2, 5), date(2024, 2, 8)))]
+
+def test_empty_ranges_are_not_asked_again(data_handler):
+    store_trading_days(data_handler, date(2024, 1, 2), TODAY,
+                        holes = [date(2024, 2, 5), date(2024, 2, 6)])
+    data_handler.store_empty_range("stock", "AAA", date(2024, 2, 5), date(2024, 2, 6))
+    assert planned(data_handler) == []
@@ -0,0 +1,95 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from ib.fetcher import HistoricalFetcher, SnapshotFetcher, TokenBucket
+from ib.ib_data_test import IBDataTest
+from lib import util
+import gcnv
+
+# The fetchers against IBDataTest, which answers in its own threads like
+# the message loop of IB
+
+# Remembers when each historical request is sent and the most waiting at once
+class RecordingIBData(IBDataTest):
+    def __init__(self, **options):
+        self.sent = [] # (ticker, time)
+        self.most_in_flight = 0
+        super().__init__(**options)
+
+    def reqHistoricalData(self, reqId, contract, *args):
+        self.sent.append((contract.symbol, time.monotonic()))
+        self.most_in_flight = max(self.most_in_flight, len(self.requests))
+        super().reqHistoricalData(reqId, contract, *args)
+
+# Historical requests are never answered
+class SilentIBData(RecordingIBData):
+    def replay_historical_data(self, *args):
+        pass
+
+@pytest.fixture
+def ib(data_handler, monkeypatch):
+    monkeypatch.setattr(gcnv, "REQUEST_TIMEOUT", 0.2)
+    def ib(ib_class = RecordingIBData, **options):
+        monkeypatch.setattr(gcnv, "ib", ib_class(**options))
+        return gcnv.ib
+    return ib
+
+def fetcher(ib, **options):
+    return HistoricalFetcher(ib, bucket = TokenBucket(1000, 1000), **options)
+
+def test_brings_every_series(ib, data_handler):
+    ib = ib(latency = 0.01)
+    assert fetcher(ib).fetch([("stock", "AAA"), ("iv", "AAA"), ("stock", "BBB")]) == []
+    for document, ticker in [("stock", "AAA"), ("iv", "AAA"), ("stock", "BBB")]:
+        assert data_handler.get_max_stored_date(document, ticker) is not None
+    assert gcnv.messages == []
+
+def test_keeps_in_flight_requests_waiting_at_most(ib, data_handler):
+    ib = ib(latency = 0.02)
+    tickers = ["AAA", "BBB", "CCC", "DDD", "EEE", "FFF"]
+    assert fetcher(ib, in_flight = 2).fetch([("stock", ticker) for ticker in tickers]) == []
+    assert ib.most_in_flight == 2
+    assert len(ib.sent) == len(tickers)
+
+def test_retries_pacing_violations_with_backoff(ib, data_handler):
+    ib = ib(pacing_violations = 2)
+    assert fetcher(ib, retries = 2, backoff = 0.05).fetch([("stock", "AAA")]) == []
+    times = [sent_time for _, sent_time in ib.sent]
+    assert len(times) == 3
+    assert times[1] - times[0] >= 0.05
+    assert times[2] - times[1] >= 0.1 # doubled
+    assert data_handler.get_max_stored_date("stock", "AAA") is not None
+
+def test_reports_pacing_violations_over_the_retries(ib, data_handler):
+    ib = ib(pacing_violations = 3)
+    assert fetcher(ib, retries = 2, backoff = 0.01).fetch([("stock", "AAA")]) == [("stock", "AAA")]
+    assert len(ib.sent) == 3
+    assert len(gcnv.messages) == 1 and "pacing violation" in gcnv.messages[0]
+
+def test_reports_timeouts(ib, data_handler):
+    ib = ib(SilentIBData)
+    assert fetcher(ib).fetch([("stock", "AAA"), ("stock", "BBB")]) == [
+        ("stock", "AAA"), ("stock", "BBB")]
+    assert gcnv.messages == ["stock,AAA not brought: timeout", "stock,BBB not brought: timeout"]
+    assert len(ib.requests) == 0
+
+def test_records_ranges_without_data_as_empty(ib, data_handler):
+    ib = ib(empty_tickers = ["AAA"])
+    today = datetime.today()
+    data_handler.store_history_block("stock", "AAA", [today - timedelta(days = 30), today],
+                                        [100.0, 100.0])
+    assert fetcher(ib).fetch([("stock", "AAA")]) == []
+    assert len(ib.sent) > 0
+    assert len(data_handler.get_empty_dates("stock", "AAA")) > 0
+    assert gcnv.messages == []
+
+def test_snapshots_return_the_tickers_that_never_ticked(ib, data_handler):
+    ib = ib(silent_tickers = ["BBB"])
+    assert SnapshotFetcher(ib, wave_size = 2).fetch("stock", ["AAA", "BBB", "CCC", "AAA"]) == ["BBB"]
+    today = util.today_in_string()
+    assert data_handler.find_in_data("stock", "AAA", today, True) is not None
+    assert data_handler.find_in_data("stock", "CCC", today, True) is not None
+    assert "BBB" not in data_handler.stock
+    assert len(ib.requests) == 0
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.datahandler import DataHandler
+from models.series import date_to_int
+import gcnv
+
+# Every DataHandler is a main.py process sharing the same data tree
+
+def dates(data_handler, ticker):
+    return list(data_handler.stock[ticker].dates) if ticker in data_handler.stock else None
+
+def test_replays_the_operations_in_order(data_tree):
+    writer = DataHandler()
+    writer.store_history("stock", "AAA", datetime(2024, 3, 14), 1.0)
+    writer.store_history_block("stock", "AAA", [datetime(2024, 3, 15), datetime(2024, 3, 18)],
+                                [2.0, 3.0])
+    writer.delete_at(datetime(2024, 3, 15))
+    writer.store_date("stock", datetime(2024, 3, 15), {"AAA": 4.0, "BBB": 5.0})
+    writer.flush()
+
+    reader = DataHandler()
+    assert dates(reader, "AAA") == [20240314, 20240315, 20240318]
+    assert list(reader.stock["AAA"].values) == [1.0, 4.0, 3.0]
+    assert dates(reader, "BBB") == [20240315]
+
+def test_operations_are_not_shared_until_flushed(data_tree):
+    writer = DataHandler()
+    writer.store_history("stock", "AAA", datetime(2024, 3, 14), 1.0)
+    assert dates(DataHandler(), "AAA") is None
+    writer.flush()
+    assert dates(DataHandler(), "AAA") == [20240314]
+
+def test_ignores_a_partially_written_operation(data_tree):
+    writer = DataHandler()
+    writer.store_history("stock", "AAA", datetime(2024, 3, 14), 1.0)
+    writer.flush()
+    with open(data_tree / "data" / "journal.log", "a") as f:
+        f.write('["store", "stock", "AAA", 2024')
+    assert dates(DataHandler(), "AAA") == [20240314]
+
+@pytest.mark.parametrize("data_format", ["json", "bin"])
+def test_compaction_keeps_the_operations_of_other_processes(data_tree, monkeypatch, data_format):
+    monkeypatch.setattr(gcnv, "DATA_FORMAT", data_format)
+    first = DataHandler()
+    second = DataHandler()
+    first.store_history("stock", "AAA", datetime(2099, 12, 30), 1.0)
+    first.flush()
+    second.store_history("stock", "BBB", datetime(2099, 12, 30), 2.0)
+    second.flush()
+    second.compact()
+    first.store_history("stock", "AAA", datetime(2099, 12, 31), 3.0)
+    first.compact()
+
+    assert (data_tree / "data" / "journal.log").stat().st_size == 0
+    reader = DataHandler()
+    assert dates(reader, "AAA") == [20991230, 20991231]
+    assert dates(reader, "BBB") == [20991230]
+
+def test_compaction_applies_deletions_in_order(data_tree):
+    writer = DataHandler()
+    writer.store_history_block("stock", "AAA", [datetime(2024, 3, 14), datetime(2024, 3, 15)],
+                                [1.0, 2.0])
+    writer.store_history("stock", "BBB", datetime(2024, 3, 15), 3.0)
+    writer.compact()
+    writer.delete_at(datetime(2024, 3, 15))
+    writer.delete_ticker("BBB")
+    writer.store_history("stock", "AAA", datetime(2024, 3, 15), 4.0)
+    writer.compact()
+
+    reader = DataHandler()
+    assert dates(reader, "AAA") == [20240314, 20240315]
+    assert list(reader.stock["AAA"].values) == [1.0, 4.0]
+    assert dates(reader, "BBB") is None
+
+def test_compaction_keeps_the_recent_empty_ranges(data_tree):
+    recent = (datetime.today() - timedelta(days = 30)).date()
+    old = (datetime.today() - timedelta(days = gcnv.GAP_FILL_BACK_DAYS + 30)).date()
+    writer = DataHandler()
+    writer.store_empty_range("stock", "AAA", recent - timedelta(days = 6), recent)
+    writer.store_empty_range("stock", "AAA", old - timedelta(days = 6), old)
+    writer.flush()
+    other = DataHandler()
+    other.compact()
+
+    empty_dates = DataHandler().get_empty_dates("stock", "AAA")
+    assert date_to_int(recent - timedelta(days = 6)) <= min(empty_dates)
+    assert max(empty_dates) <= date_to_int(recent)
+    assert other.get_empty_dates("stock", "AAA") == empty_dates
+
+def test_discard_keeps_the_operations_of_other_processes(data_tree):
+    discarded = DataHandler()
+    kept = DataHandler()
+    discarded.store_history("stock", "AAA", datetime(2024, 3, 14), 1.0)
+    discarded.flush()
+    kept.store_history("stock", "BBB", datetime(2024, 3, 14), 2.0)
+    kept.flush()
+    discarded.store_history("stock", "AAA", datetime(2024, 3, 15), 3.0)
+    discarded.discard()
+
+    reader = DataHandler()
+    assert dates(reader, "AAA") is None
+    assert dates(reader, "BBB") == [20240314]
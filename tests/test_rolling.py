@@ -0,0 +1,54 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from models.rolling import rolling_ranks
+from models.series import date_to_int, int_to_date
+
+# rolling_ranks against calculating every window again
+
+def series(count, seed):
+    generator = random.Random(seed)
+    day = datetime(2015, 1, 2)
+    dates = []
+    values = []
+    for _ in range(count):
+        day += timedelta(days = generator.choice([1, 1, 1, 3, 4]))
+        dates.append(date_to_int(day))
+        values.append(round(generator.uniform(10, 40), 1)) # repeated values too
+    return dates, values
+
+def brute_force_ranks(dates, values, back_days, start):
+    ranks = []
+    for i, date in enumerate(dates):
+        end = int_to_date(date)
+        if end < start:
+            continue
+        window = [value for window_date, value in zip(dates[:i + 1], values[:i + 1])
+                    if int_to_date(window_date) > end - timedelta(days = back_days)]
+        low, high = min(window), max(window)
+        ranks.append((date,
+            None if high == low else (values[i] - low) / (high - low) * 100,
+            sum(1 for value in window if values[i] >= value) / len(window) * 100))
+    return ranks
+
+@pytest.mark.parametrize("back_days", [1, 30, 91, 365])
+def test_rolling_ranks_match_brute_force(back_days):
+    dates, values = series(600, back_days)
+    start = int_to_date(dates[0]) + timedelta(days = back_days - 1)
+    assert rolling_ranks(dates, values, back_days) == pytest.approx(
+                brute_force_ranks(dates, values, back_days, start))
+
+def test_rolling_ranks_from_start():
+    dates, values = series(300, 1)
+    start = int_to_date(dates[200])
+    ranks = rolling_ranks(dates, values, 91, start)
+    assert ranks[0][0] == dates[200]
+    assert ranks == pytest.approx(brute_force_ranks(dates, values, 91, start))
+
+def test_rolling_ranks_flat_and_empty():
+    dates, _ = series(20, 2)
+    assert all(mm_rank is None and percentile_rank == 100
+                for _, mm_rank, percentile_rank in rolling_ranks(dates, [5.0] * 20, 10))
+    assert rolling_ranks([], [], 10) == []